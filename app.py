@@ -1,35 +1,22 @@
 import streamlit as st
 import pandas as pd
-import time
 from datetime import datetime, date
 from database_sheets import (
     inicializar_banco, adicionar_aluguel, adicionar_transacao, buscar_dados_do_mes,
-    atualizar_status_aluguel, deletar_registro, gerar_resumo_financeiro,
+    atualizar_status_em_lote, deletar_registro, gerar_resumo_financeiro,
     obter_dias_semana, obter_meses_referencia, obter_status_aluguel, obter_tipos_transacao,
-    validar_ano, formatar_mes_ano, obter_anos_disponiveis, buscar_dados_do_ano
+    validar_ano, formatar_mes_ano, obter_anos_disponiveis, buscar_ano, formatar_moeda, para_reais
 )
 
-def safe_numeric_conversion(series, fill_value=0):
-    """Converte série para tipo numérico de forma segura."""
-    try:
-        return pd.to_numeric(series, errors='coerce').fillna(fill_value)
-    except:
-        return pd.Series([fill_value] * len(series))
-
 def safe_datetime_conversion(series):
     """Converte série para datetime de forma segura."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
     try:
         return pd.to_datetime(series, errors='coerce')
     except:
         return pd.Series([pd.NaT] * len(series))
 
-# Initialize database with error handling
-try:
-    inicializar_banco()
-except Exception as e:
-    st.error("❌ Erro ao inicializar o banco de dados. Verifique suas credenciais do Google Sheets.")
-    st.stop()
-
 st.set_page_config(
     page_title="Quadra Financeiro",
     page_icon="🏟️",
@@ -37,6 +24,13 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Initialize database with error handling
+try:
+    inicializar_banco()
+except Exception as e:
+    st.error("❌ Erro ao inicializar o banco de dados. Verifique suas credenciais do Google Sheets.")
+    st.stop()
+
 
 def dashboard_page():
     st.title("🏟️ Dashboard Financeiro")
@@ -58,22 +52,12 @@ def dashboard_page():
     try:
         alugueis_df, transacoes_df = buscar_dados_do_mes(ano_selecionado, mes_selecionado)
 
-        # Garantir tipos de dados corretos para cálculos
-        if not alugueis_df.empty:
-            alugueis_df['valor'] = safe_numeric_conversion(alugueis_df['valor'])
-            total_alugueis = alugueis_df[alugueis_df['status'] == 'Pago']['valor'].sum()
-            total_alugueis_a_pagar = alugueis_df[alugueis_df['status'] != 'Pago']['valor'].sum()
-        else:
-            total_alugueis = 0
-            total_alugueis_a_pagar = 0
-
-        if not transacoes_df.empty:
-            transacoes_df['valor'] = safe_numeric_conversion(transacoes_df['valor'])
-            total_outras_entradas = transacoes_df[transacoes_df['tipo'] == 'Entrada']['valor'].sum()
-            total_saidas = transacoes_df[transacoes_df['tipo'] == 'Saída']['valor'].sum()
-        else:
-            total_outras_entradas = 0
-            total_saidas = 0
+        # Totais do mês vêm do resumo pré-calculado (em centavos)
+        resumo = gerar_resumo_financeiro(ano_selecionado, mes_selecionado)
+        total_alugueis = resumo['alugueis']['total_pago']
+        total_alugueis_a_pagar = resumo['alugueis']['total_a_pagar']
+        total_outras_entradas = resumo['transacoes']['total_entradas']
+        total_saidas = resumo['transacoes']['total_saidas']
 
         total_entradas = total_alugueis + total_outras_entradas
         saldo_final = total_entradas - total_saidas
@@ -83,26 +67,26 @@ def dashboard_page():
         col1, col2, col3, col4 = st.columns(4)
 
         with col1:
-            st.metric("Total Recebido (Aluguéis)", f"R$ {total_alugueis:,.2f}")
+            st.metric("Total Recebido (Aluguéis)", formatar_moeda(total_alugueis))
 
         with col2:
-            st.metric("Outras Entradas", f"R$ {total_outras_entradas:,.2f}")
+            st.metric("Outras Entradas", formatar_moeda(total_outras_entradas))
 
         with col3:
-            st.metric("Total Saídas", f"R$ {total_saidas:,.2f}")
+            st.metric("Total Saídas", formatar_moeda(total_saidas))
 
         with col4:
-            st.metric("Saldo Final", f"R$ {saldo_final:,.2f}",
-                     delta=None if saldo_final == 0 else (f"R$ {saldo_final:,.2f}"))
+            st.metric("Saldo Final", formatar_moeda(saldo_final),
+                     delta=None if saldo_final == 0 else formatar_moeda(saldo_final))
 
         if total_alugueis_a_pagar > 0:
-            st.warning(f"⚠️ Existem aluguéis a receber no valor de R$ {total_alugueis_a_pagar:,.2f}")
+            st.warning(f"⚠️ Existem aluguéis a receber no valor de {formatar_moeda(total_alugueis_a_pagar)}")
 
         st.subheader("📈 Gráfico Comparativo")
 
         dados_grafico = pd.DataFrame({
             'Categoria': ['Entradas', 'Saídas'],
-            'Valor': [total_entradas, total_saidas]
+            'Valor': [para_reais(total_entradas), para_reais(total_saidas)]
         })
 
         st.bar_chart(dados_grafico.set_index('Categoria'))
@@ -113,7 +97,7 @@ def dashboard_page():
             st.subheader("🏟️ Detalhes dos Aluguéis")
             if not alugueis_df.empty:
                 alugueis_display = alugueis_df.copy()
-                alugueis_display['valor'] = alugueis_display['valor'].map(lambda x: f"R$ {x:,.2f}")
+                alugueis_display['valor'] = alugueis_display['valor'].map(formatar_moeda)
                 # Reorganizar colunas: mostrar mes_referencia e dia_semana, remover data_criacao, mover id para o fim
                 colunas_ordem = ['mes_referencia', 'dia_semana', 'horario_inicio', 'horas_alugadas', 'cliente_time', 'valor', 'status', 'id']
                 colunas_disponiveis = [col for col in colunas_ordem if col in alugueis_display.columns]
@@ -126,7 +110,7 @@ def dashboard_page():
             st.subheader("💰 Outras Transações")
             if not transacoes_df.empty:
                 transacoes_display = transacoes_df.copy()
-                transacoes_display['valor'] = transacoes_display['valor'].map(lambda x: f"R$ {x:,.2f}")
+                transacoes_display['valor'] = transacoes_display['valor'].map(formatar_moeda)
                 st.dataframe(transacoes_display, use_container_width=True)
             else:
                 st.info("Nenhuma transação registrada neste mês.")
@@ -210,7 +194,6 @@ def adicionar_aluguel_page():
                         status=status
                     )
                     st.success("✅ Aluguel registrado com sucesso!")
-                    time.sleep(0.5)  # Pequeno delay para garantir que o Google Sheets processe
                     st.rerun()
                 except Exception as e:
                     st.error(f"Erro ao salvar aluguel: {str(e)}")
@@ -250,7 +233,6 @@ def adicionar_transacao_page():
                         observacao=observacao.strip() if observacao.strip() else None
                     )
                     st.success("✅ Transação registrada com sucesso!")
-                    time.sleep(0.5)  # Pequeno delay para garantir que o Google Sheets processe
                     st.rerun()
                 except Exception as e:
                     st.error(f"Erro ao salvar transação: {str(e)}")
@@ -268,29 +250,12 @@ def ver_lancamentos_page():
 
     if tipo_visualizacao == "Aluguéis":
         try:
-            # Use optimized single API call for yearly data
-            dados_ano = buscar_dados_do_ano(ano_selecionado)
-
-            todos_alugueis = []
-            for mes in range(1, 13):
-                df_aluguel_mes, _ = dados_ano[mes]
-                if not df_aluguel_mes.empty:
-                    todos_alugueis.append(df_aluguel_mes)
-
-            if todos_alugueis:
-                alugueis_completos = pd.concat(todos_alugueis, ignore_index=True)
+            # Ano inteiro de uma vez, já ordenado por mês
+            alugueis_completos, _ = buscar_ano(ano_selecionado)
 
-                # Garantir que mes_referencia seja string para ordenação correta
-                alugueis_completos['mes_referencia'] = alugueis_completos['mes_referencia'].astype(str)
-
-                # Ordenação segura
-                try:
-                    alugueis_completos = alugueis_completos.sort_values('mes_referencia')
-                except Exception as sort_error:
-                    st.warning(f"⚠️ Erro ao ordenar dados: {sort_error}")
-
-                # Formatar para display APÓS todas as operações de dados
-                alugueis_completos['valor'] = alugueis_completos['valor'].map(lambda x: f"R$ {x:,.2f}")
+            if not alugueis_completos.empty:
+                # Formatar para display numa nova tabela, sem alterar os dados compartilhados
+                alugueis_completos = alugueis_completos.assign(valor=alugueis_completos['valor'].map(formatar_moeda))
 
                 # Reorganizar colunas: mostrar mes_referencia e dia_semana, remover data_criacao, mover id para o fim
                 colunas_ordem = ['mes_referencia', 'dia_semana', 'horario_inicio', 'horas_alugadas', 'cliente_time', 'valor', 'status', 'id']
@@ -305,20 +270,14 @@ def ver_lancamentos_page():
 
     else:
         try:
-            # Use optimized single API call for yearly data
-            dados_ano = buscar_dados_do_ano(ano_selecionado)
-
-            todas_transacoes = []
-            for mes in range(1, 13):
-                _, df_transacao_mes = dados_ano[mes]
-                if not df_transacao_mes.empty:
-                    todas_transacoes.append(df_transacao_mes)
-
-            if todas_transacoes:
-                transacoes_completas = pd.concat(todas_transacoes, ignore_index=True)
+            # Ano inteiro de uma vez, já ordenado por mês
+            _, transacoes_completas = buscar_ano(ano_selecionado)
 
+            if not transacoes_completas.empty:
                 # Garantir que data_transacao seja datetime para ordenação correta
-                transacoes_completas['data_transacao'] = safe_datetime_conversion(transacoes_completas['data_transacao'])
+                transacoes_completas = transacoes_completas.assign(
+                    data_transacao=safe_datetime_conversion(transacoes_completas['data_transacao'])
+                )
 
                 # Ordenação segura - remover datas inválidas antes de ordenar
                 try:
@@ -329,7 +288,7 @@ def ver_lancamentos_page():
                     st.warning(f"⚠️ Erro ao ordenar transações: {sort_error}")
 
                 # Formatar para display APÓS todas as operações de dados
-                transacoes_completas['valor'] = transacoes_completas['valor'].map(lambda x: f"R$ {x:,.2f}")
+                transacoes_completas = transacoes_completas.assign(valor=transacoes_completas['valor'].map(formatar_moeda))
                 st.dataframe(transacoes_completas, use_container_width=True)
             else:
                 st.info(f"Nenhuma transação registrada no ano {ano_selecionado}.")
@@ -342,18 +301,11 @@ def editar_status_aluguel_page():
     st.markdown("Marque aluguéis como pagos ou atualize seu status.")
 
     try:
-        # Use optimized single API call for yearly data
-        todos_alugueis = []
+        # Ano inteiro de uma vez, já ordenado por mês
         ano_atual = date.today().year
-        dados_ano = buscar_dados_do_ano(ano_atual)
-
-        for mes in range(1, 13):
-            df_aluguel_mes, _ = dados_ano[mes]
-            if not df_aluguel_mes.empty:
-                todos_alugueis.append(df_aluguel_mes)
+        alugueis_df, _ = buscar_ano(ano_atual)
 
-        if todos_alugueis:
-            alugueis_df = pd.concat(todos_alugueis, ignore_index=True)
+        if not alugueis_df.empty:
             alugueis_pendentes = alugueis_df[alugueis_df['status'] != 'Pago'].copy()
 
             if not alugueis_pendentes.empty:
@@ -362,36 +314,49 @@ def editar_status_aluguel_page():
                 # Criar cópia para display para não afetar os dados originais
                 display_df = alugueis_pendentes.copy()
                 display_df['display_text'] = (
+                    '#' + display_df['id'].astype(str) + ' - ' +
                     display_df['mes_referencia'] + ' - ' +
-                    display_df['dia_semana'] + ' - ' +
-                    display_df['cliente_time'] + ' - ' +
-                    'R$ ' + display_df['valor'].astype(str) + ' - ' +
-                    display_df['status']
+                    display_df['dia_semana'].astype(str) + ' - ' +
+                    display_df['cliente_time'].astype(str) + ' - ' +
+                    display_df['valor'].map(formatar_moeda) + ' - ' +
+                    display_df['status'].astype(str)
                 )
 
-                aluguel_selecionado = st.selectbox(
-                    "Selecione o aluguel para editar:",
+                alugueis_selecionados = st.multiselect(
+                    "Selecione os aluguéis para editar:",
                     display_df['display_text'].tolist()
                 )
 
-                if aluguel_selecionado:
-                    aluguel_info = alugueis_pendentes[
-                        display_df['display_text'] == aluguel_selecionado
-                    ].iloc[0]
+                if alugueis_selecionados:
+                    selecionados = alugueis_pendentes[
+                        display_df['display_text'].isin(alugueis_selecionados)
+                    ]
+
+                    if len(selecionados) == 1:
+                        aluguel_info = selecionados.iloc[0]
 
-                    st.markdown("### 📝 Detalhes do Aluguel")
-                    col1, col2 = st.columns(2)
+                        st.markdown("### 📝 Detalhes do Aluguel")
+                        col1, col2 = st.columns(2)
 
-                    with col1:
-                        st.write(f"**Mês de Referência:** {aluguel_info['mes_referencia']}")
-                        st.write(f"**Dia da Semana:** {aluguel_info['dia_semana']}")
-                        st.write(f"**Cliente/Time:** {aluguel_info['cliente_time']}")
+                        with col1:
+                            st.write(f"**Mês de Referência:** {aluguel_info['mes_referencia']}")
+                            st.write(f"**Dia da Semana:** {aluguel_info['dia_semana']}")
+                            st.write(f"**Cliente/Time:** {aluguel_info['cliente_time']}")
 
-                    with col2:
-                        st.write(f"**Horário:** {aluguel_info['horario_inicio']}")
-                        st.write(f"**Valor:** R$ {aluguel_info['valor']:,.2f}")
-                        st.write(f"**Status Atual:** {aluguel_info['status']}")
-                        st.write(f"**Duração:** {aluguel_info['horas_alugadas']}h")
+                        with col2:
+                            st.write(f"**Horário:** {aluguel_info['horario_inicio']}")
+                            st.write(f"**Valor:** {formatar_moeda(aluguel_info['valor'])}")
+                            st.write(f"**Status Atual:** {aluguel_info['status']}")
+                            st.write(f"**Duração:** {aluguel_info['horas_alugadas']}h")
+                    else:
+                        st.markdown(f"### 📝 {len(selecionados)} Aluguéis Selecionados")
+                        st.dataframe(
+                            selecionados[['mes_referencia', 'dia_semana', 'cliente_time', 'horario_inicio', 'valor', 'status']]
+                            .assign(valor=selecionados['valor'].map(formatar_moeda)),
+                            use_container_width=True,
+                            hide_index=True
+                        )
+                        st.write(f"**Valor Total:** {formatar_moeda(selecionados['valor'].sum())}")
 
                     st.markdown("---")
 
@@ -407,23 +372,23 @@ def editar_status_aluguel_page():
 
                         with col2:
                             st.write("**Confirmação**")
-                            st.markdown("Deseja atualizar o status deste aluguel?")
+                            st.markdown(f"Deseja atualizar o status de {len(selecionados)} aluguel(is)?")
 
                         submitted = st.form_submit_button("✅ Atualizar Status")
 
                         if submitted:
                             try:
-                                sucesso = atualizar_status_aluguel(
-                                    int(aluguel_info['id']),
+                                # Todos os selecionados em uma única escrita na planilha
+                                atualizados = atualizar_status_em_lote(
+                                    [int(id_aluguel) for id_aluguel in selecionados['id']],
                                     novo_status
                                 )
 
-                                if sucesso:
-                                    st.success(f"✅ Status do aluguel atualizado para '{novo_status}' com sucesso!")
-                                    time.sleep(0.5)  # Pequeno delay para garantir que o Google Sheets processe
+                                if atualizados:
+                                    st.success(f"✅ Status de {atualizados} aluguel(is) atualizado para '{novo_status}' com sucesso!")
                                     st.rerun()
                                 else:
-                                    st.error("❌ Erro ao atualizar o status do aluguel.")
+                                    st.error("❌ Erro ao atualizar o status dos aluguéis.")
 
                             except Exception as e:
                                 st.error(f"❌ Erro ao atualizar: {str(e)}")
@@ -456,7 +421,21 @@ def main():
 
         st.markdown("---")
         st.markdown("### 📊 Resumo Rápido")
+        resumo_rapido = st.container()
 
+    # A página vem primeiro: o resumo da barra lateral é preenchido depois, sem atrasar os formulários
+    if pagina == "Dashboard":
+        dashboard_page()
+    elif pagina == "Adicionar Aluguel":
+        adicionar_aluguel_page()
+    elif pagina == "Adicionar Transação":
+        adicionar_transacao_page()
+    elif pagina == "Editar Status de Aluguel":
+        editar_status_aluguel_page()
+    elif pagina == "Ver Todos os Lançamentos":
+        ver_lancamentos_page()
+
+    with resumo_rapido:
         try:
             hoje = date.today()
             # Usar gerar_resumo_financeiro para melhor performance e cache
@@ -469,13 +448,13 @@ def main():
             col1, col2, col3 = st.columns(3)
 
             with col1:
-                st.metric("Aluguéis esse mês", f"R$ {total_alugueis_mes:,.0f}")
+                st.metric("Aluguéis esse mês", formatar_moeda(total_alugueis_mes, casas=0))
 
             with col2:
-                st.metric("Outras Entradas", f"R$ {total_outras_entradas_mes:,.0f}")
+                st.metric("Outras Entradas", formatar_moeda(total_outras_entradas_mes, casas=0))
 
             with col3:
-                st.metric("Despesas", f"R$ {total_saidas_mes:,.0f}")
+                st.metric("Despesas", formatar_moeda(total_saidas_mes, casas=0))
 
             # Mostrar último update
             st.caption(f"📅 Atualizado: {datetime.now().strftime('%H:%M:%S')}")
@@ -486,16 +465,5 @@ def main():
             else:
                 st.write("Dados não disponíveis")
 
-    if pagina == "Dashboard":
-        dashboard_page()
-    elif pagina == "Adicionar Aluguel":
-        adicionar_aluguel_page()
-    elif pagina == "Adicionar Transação":
-        adicionar_transacao_page()
-    elif pagina == "Editar Status de Aluguel":
-        editar_status_aluguel_page()
-    elif pagina == "Ver Todos os Lançamentos":
-        ver_lancamentos_page()
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,52 @@
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Optional
+
+
+class ChangeProbe(ABC):
+    """Sonda barata de alterações na planilha, consultada antes de baixar as worksheets.
+
+    versao() retorna um marcador que muda sempre que a planilha é alterada (None se não
+    for possível saber). Enquanto o marcador for o mesmo de uma leitura anterior, os
+    dados daquela leitura continuam atuais e o download pode ser pulado.
+    """
+
+    @abstractmethod
+    def versao(self) -> Optional[str]:
+        """Marcador da versão atual da planilha, ou None se não for possível saber."""
+
+
+class DriveModifiedTimeProbe(ChangeProbe):
+    """Usa o modifiedTime do arquivo no Drive (uma chamada de metadados, sem baixar células).
+
+    Recebe uma função que retorna a spreadsheet atual, já que ela é recriada a cada
+    reconexão.
+    """
+
+    def __init__(self, obter_spreadsheet: Callable[[], object]):
+        self.obter_spreadsheet = obter_spreadsheet
+
+    def versao(self) -> Optional[str]:
+        spreadsheet = self.obter_spreadsheet()
+        if spreadsheet is None:
+            return None
+        return spreadsheet.get_lastUpdateTime()
+
+
+class LocalChangeProbe(ChangeProbe):
+    """Substituto local para testes: a versão só muda quando marcar_alteracao() é chamado."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versao = 0
+        self.consultas = 0
+
+    def marcar_alteracao(self):
+        """Simula uma edição na planilha."""
+        with self._lock:
+            self._versao += 1
+
+    def versao(self) -> Optional[str]:
+        with self._lock:
+            self.consultas += 1
+            return str(self._versao)
@@ -0,0 +1,129 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+# Pragmas aplicados a cada conexão nova:
+# WAL permite leituras simultâneas a uma escrita; com WAL, synchronous=NORMAL só
+# sincroniza o disco no checkpoint e continua seguro contra corrupção
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,  # ~16 MB de cache de páginas (valor negativo = KiB)
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY'
+}
+
+
+class ConnectionPool:
+    """Pool thread-safe de conexões SQLite reaproveitadas entre chamadas.
+
+    Cada conexão é aberta uma vez, configurada com os PRAGMAS (modo WAL) e mantém o
+    cache de statements preparados do sqlite3, então consultas repetidas não são
+    recompiladas. Uma conexão é usada por uma thread de cada vez; quando todas estão
+    em uso, conexao() espera até que uma seja devolvida.
+    """
+
+    def __init__(self, db_file: str, tamanho: int = 5, timeout: float = 30, statements_em_cache: int = 128):
+        self.db_file = db_file
+        self.tamanho = tamanho
+        self.timeout = timeout
+        self.statements_em_cache = statements_em_cache
+        self._livres: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._abertas = 0
+        self.esperas = 0
+
+    def _conectar(self) -> sqlite3.Connection:
+        """Abre uma conexão nova com os pragmas do pool."""
+        # check_same_thread=False: a conexão passa de uma thread a outra, mas nunca é usada por duas ao mesmo tempo
+        conn = sqlite3.connect(
+            self.db_file, timeout=self.timeout, check_same_thread=False,
+            cached_statements=self.statements_em_cache
+        )
+        for pragma, valor in PRAGMAS.items():
+            conn.execute(f'PRAGMA {pragma} = {valor}')
+        return conn
+
+    def _obter(self) -> sqlite3.Connection:
+        """Pega uma conexão livre, abre uma nova se houver vaga ou espera uma ser devolvida."""
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            abrir = self._abertas < self.tamanho
+            if abrir:
+                self._abertas += 1
+            else:
+                self.esperas += 1
+
+        if abrir:
+            try:
+                return self._conectar()
+            except BaseException:
+                with self._lock:
+                    self._abertas -= 1
+                raise
+
+        try:
+            return self._livres.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"Nenhuma conexão livre no pool após {self.timeout}s")
+
+    @contextmanager
+    def conexao(self) -> Iterator[sqlite3.Connection]:
+        """Empresta uma conexão do pool durante o bloco with.
+
+        Uma transação deixada aberta (por erro ou falta de commit) é desfeita antes de a
+        conexão voltar ao pool.
+        """
+        conn = self._obter()
+        try:
+            yield conn
+        finally:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                # Conexão inutilizável: descartar em vez de devolver
+                conn.close()
+                self._repor()
+            else:
+                self._livres.put(conn)
+
+    def _repor(self):
+        """Abre uma conexão no lugar de uma descartada, para acordar quem espera em _obter().
+
+        Se não for possível abrir, a vaga é liberada e a próxima chamada a _obter() tenta de novo.
+        """
+        try:
+            conn = self._conectar()
+        except sqlite3.Error:
+            with self._lock:
+                self._abertas -= 1
+        else:
+            self._livres.put(conn)
+
+    def fechar(self):
+        """Fecha as conexões livres; as emprestadas no momento continuam válidas até serem devolvidas."""
+        while True:
+            try:
+                conn = self._livres.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+            with self._lock:
+                self._abertas -= 1
+
+    def metricas(self) -> Dict[str, Any]:
+        """Retorna o estado do pool: conexões abertas, livres e quantas vezes foi preciso esperar."""
+        with self._lock:
+            return {
+                'abertas': self._abertas,
+                'livres': self._livres.qsize(),
+                'tamanho': self.tamanho,
+                'esperas': self.esperas
+            }
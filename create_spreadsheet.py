@@ -46,18 +46,18 @@ def create_spreadsheet():
         print("\n=== Criando Worksheets ===")
 
         # Create alugueis worksheet
-        alugueis_ws = spreadsheet.add_worksheet("alugueis", 1, 9)
+        alugueis_ws = spreadsheet.add_worksheet("alugueis", 1, 10)
         headers_alugueis = [
             'id', 'dia_semana', 'mes_referencia', 'horario_inicio',
-            'horas_alugadas', 'cliente_time', 'valor', 'status', 'data_criacao'
+            'horas_alugadas', 'cliente_time', 'valor', 'status', 'data_criacao', 'excluido_em'
         ]
         alugueis_ws.append_row(headers_alugueis)
         print("✓ Worksheet 'alugueis' criada com cabeçalhos")
 
         # Create transacoes worksheet
-        transacoes_ws = spreadsheet.add_worksheet("transacoes", 1, 7)
+        transacoes_ws = spreadsheet.add_worksheet("transacoes", 1, 8)
         headers_transacoes = [
-            'id', 'data_transacao', 'tipo', 'descricao', 'valor', 'observacao', 'data_criacao'
+            'id', 'data_transacao', 'tipo', 'descricao', 'valor', 'observacao', 'data_criacao', 'excluido_em'
         ]
         transacoes_ws.append_row(headers_transacoes)
         print("✓ Worksheet 'transacoes' criada com cabeçalhos")
@@ -0,0 +1,304 @@
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+import pandas as pd
+
+# Dependência de uma entrada que usa todos os meses de uma tabela
+TODOS_OS_MESES = '*'
+
+
+def estimar_tamanho(data: Any) -> int:
+    """Estima em bytes a memória ocupada por um valor do cache (DataFrames pelo memory_usage)."""
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(index=True, deep=True).sum())
+    if isinstance(data, pd.Series):
+        return int(data.memory_usage(index=True, deep=True))
+    if isinstance(data, (tuple, list)):
+        return sys.getsizeof(data) + sum(estimar_tamanho(item) for item in data)
+    if isinstance(data, dict):
+        return sys.getsizeof(data) + sum(estimar_tamanho(k) + estimar_tamanho(v) for k, v in data.items())
+    return sys.getsizeof(data)
+
+
+class DataCache:
+    """Cache LRU com TTL e orçamento de memória em que cada entrada registra de quais (tabela, mês) depende.
+
+    Uma escrita em um mês só remove as entradas que dependem daquele mês ou da tabela
+    inteira; as demais continuam válidas. Quando o total estimado passa de max_bytes, as
+    entradas usadas há mais tempo são descartadas. Os contadores de metricas() permitem
+    acompanhar a taxa de acerto para ajustar o TTL.
+
+    O TTL é flexível (stale-while-revalidate): passado ttl, consultar() ainda entrega a
+    entrada marcada como vencida, para que ela seja servida enquanto revalidar() a
+    recarrega em segundo plano; só depois de ttl_maximo a entrada deixa de existir.
+    """
+
+    def __init__(self, ttl: float = 60, max_bytes: int = 64 * 1024 * 1024, ttl_maximo: Optional[float] = None):
+        self.ttl = ttl
+        self.ttl_maximo = max(ttl, ttl_maximo if ttl_maximo is not None else ttl)
+        self.max_bytes = max_bytes
+        self._entradas: "OrderedDict[str, Tuple[float, Any, frozenset, int]]" = OrderedDict()
+        self._dependentes: Dict[Tuple[str, str], Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._expiracao_thread = None
+        # Incrementada a cada invalidação: uma carga que começou antes de uma invalidação feita
+        # por outra thread não grava dados possivelmente anteriores à escrita
+        self._geracao = 0
+        self._local = threading.local()
+
+        self._revalidacoes: "queue.Queue[Tuple[str, Callable[[], Any]]]" = queue.Queue()
+        self._revalidando: Set[str] = set()
+        self._revalidacao_thread = None
+
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.revalidations = 0
+        self.revalidation_errors = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Retorna o valor da entrada se ela existir e estiver dentro do TTL."""
+        data, vencida = self.consultar(key)
+        return None if vencida else data
+
+    def consultar(self, key: str) -> Tuple[Optional[Any], bool]:
+        """Retorna (valor, vencida): a entrada ainda é entregue entre ttl e ttl_maximo, marcada como vencida.
+
+        Sem entrada (ou passado ttl_maximo) retorna (None, False).
+        """
+        with self._lock:
+            entrada = self._entradas.get(key)
+            idade = time.time() - entrada[0] if entrada is not None else None
+            if entrada is None or idade >= self.ttl_maximo:
+                self.misses += 1
+                return None, False
+
+            self._entradas.move_to_end(key)
+            vencida = idade >= self.ttl
+            if vencida:
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+            return entrada[1], vencida
+
+    def geracao(self) -> Tuple[int, int]:
+        """Marca do início de uma carga, a ser passada para set() na mesma thread.
+
+        Invalidações feitas pela própria thread durante a carga (a sincronização que a
+        antecede) não descartam o resultado; as de outras threads, sim.
+        """
+        with self._lock:
+            return self._geracao, getattr(self._local, 'invalidacoes', 0)
+
+    def set(self, key: str, data: Any, deps: Iterable[Tuple[str, str]], geracao: Optional[Tuple[int, int]] = None):
+        """Armazena o valor junto com as dependências (tabela, mês YYYY-MM ou TODOS_OS_MESES).
+
+        Com geracao (valor de geracao() antes de carregar os dados), o valor é descartado
+        se outra thread invalidou o cache nesse meio-tempo.
+        """
+        deps = frozenset(deps)
+        tamanho = estimar_tamanho(data)
+        with self._lock:
+            if geracao is not None:
+                proprias = getattr(self._local, 'invalidacoes', 0) - geracao[1]
+                if self._geracao - geracao[0] != proprias:
+                    return
+            self._remover(key)
+            if tamanho > self.max_bytes:
+                return
+
+            self._entradas[key] = (time.time(), data, deps, tamanho)
+            self._bytes += tamanho
+            for dep in deps:
+                self._dependentes.setdefault(dep, set()).add(key)
+
+            # Descartar as entradas menos usadas recentemente até caber no orçamento
+            while self._bytes > self.max_bytes:
+                key_antiga = next(iter(self._entradas))
+                self._remover(key_antiga)
+                self.evictions += 1
+
+    def invalidate(self, tabela: str, mes: Optional[str] = None) -> int:
+        """Remove as entradas afetadas por uma mudança em um mês da tabela (ou em todos, se mes=None).
+
+        Returns:
+            Quantidade de entradas removidas
+        """
+        with self._lock:
+            self._contar_invalidacao()
+            if mes is None:
+                deps = [dep for dep in self._dependentes if dep[0] == tabela]
+            else:
+                deps = [(tabela, mes), (tabela, TODOS_OS_MESES)]
+
+            keys = set()
+            for dep in deps:
+                keys |= self._dependentes.get(dep, set())
+
+            for key in keys:
+                self._remover(key)
+            return len(keys)
+
+    def clear(self):
+        """Remove todas as entradas."""
+        with self._lock:
+            self._contar_invalidacao()
+            self._entradas.clear()
+            self._dependentes.clear()
+            self._bytes = 0
+
+    def remover_expirados(self) -> int:
+        """Remove as entradas que já passaram do TTL máximo (as apenas vencidas ainda podem ser servidas).
+
+        Returns:
+            Quantidade de entradas removidas
+        """
+        limite = time.time() - self.ttl_maximo
+        with self._lock:
+            keys = [key for key, entrada in self._entradas.items() if entrada[0] <= limite]
+            for key in keys:
+                self._remover(key)
+            self.expirations += len(keys)
+            return len(keys)
+
+    def iniciar_expiracao(self, intervalo: float = 30):
+        """Inicia uma thread em segundo plano que remove entradas expiradas periodicamente."""
+        if self._expiracao_thread is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(intervalo)
+                self.remover_expirados()
+
+        self._expiracao_thread = threading.Thread(target=loop, daemon=True)
+        self._expiracao_thread.start()
+
+    def revalidar(self, key: str, recarregar: Callable[[], Any]) -> bool:
+        """Agenda a recarga de uma entrada vencida na thread de revalidação.
+
+        recarregar é responsável por gravar o novo valor (com set). Pedidos para uma key
+        que já está na fila ou sendo recarregada são ignorados.
+
+        Returns:
+            True se a recarga foi agendada
+        """
+        with self._lock:
+            if key in self._revalidando:
+                return False
+            self._revalidando.add(key)
+            if self._revalidacao_thread is None:
+                self._revalidacao_thread = threading.Thread(target=self._loop_revalidacao, daemon=True)
+                self._revalidacao_thread.start()
+
+        self._revalidacoes.put((key, recarregar))
+        return True
+
+    def _loop_revalidacao(self):
+        """Executa as recargas agendadas, uma de cada vez."""
+        while True:
+            key, recarregar = self._revalidacoes.get()
+            try:
+                recarregar()
+                with self._lock:
+                    self.revalidations += 1
+            except Exception as e:
+                # A entrada vencida continua sendo servida até o TTL máximo
+                with self._lock:
+                    self.revalidation_errors += 1
+                print(f"AVISO: Falha ao revalidar '{key}' em segundo plano: {str(e)}")
+            finally:
+                with self._lock:
+                    self._revalidando.discard(key)
+
+    def metricas(self) -> Dict[str, Any]:
+        """Retorna contadores de uso do cache (hits, misses, evictions, expirations) e ocupação."""
+        with self._lock:
+            consultas = self.hits + self.stale_hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale_hits': self.stale_hits,
+                'hit_rate': (self.hits + self.stale_hits) / consultas if consultas else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'revalidations': self.revalidations,
+                'revalidation_errors': self.revalidation_errors,
+                'revalidating': len(self._revalidando),
+                'entries': len(self._entradas),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'ttl_maximo': self.ttl_maximo
+            }
+
+    def _contar_invalidacao(self):
+        """Avança a geração, registrando que a invalidação partiu da thread atual."""
+        self._geracao += 1
+        self._local.invalidacoes = getattr(self._local, 'invalidacoes', 0) + 1
+
+    def _remover(self, key: str):
+        """Remove uma entrada e suas referências no índice de dependências."""
+        entrada = self._entradas.pop(key, None)
+        if entrada is None:
+            return
+
+        self._bytes -= entrada[3]
+        for dep in entrada[2]:
+            dependentes = self._dependentes.get(dep)
+            if dependentes is not None:
+                dependentes.discard(key)
+                if not dependentes:
+                    del self._dependentes[dep]
+
+
+class _Chamada:
+    """Chamada em andamento compartilhada pelo SingleFlight."""
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class SingleFlight:
+    """Agrupa chamadas concorrentes com a mesma chave: só a primeira executa, as demais esperam o resultado."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chamadas: Dict[str, _Chamada] = {}
+        self.coalesced = 0
+
+    def do(self, key: str, fn, *args, **kwargs):
+        """Executa fn(*args, **kwargs) ou aguarda a execução em andamento com a mesma chave."""
+        with self._lock:
+            chamada = self._chamadas.get(key)
+            lider = chamada is None
+            if lider:
+                chamada = self._chamadas[key] = _Chamada()
+            else:
+                self.coalesced += 1
+
+        if not lider:
+            chamada.evento.wait()
+            if chamada.erro is not None:
+                raise chamada.erro
+            return chamada.resultado
+
+        try:
+            chamada.resultado = fn(*args, **kwargs)
+            return chamada.resultado
+        except BaseException as e:
+            chamada.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._chamadas[key]
+            chamada.evento.set()
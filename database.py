@@ -1,13 +1,33 @@
 import sqlite3
+import threading
 import pandas as pd
-from datetime import datetime, date
-from typing import Tuple, Optional
+from datetime import datetime, date, timedelta
+from typing import Tuple, Optional, Dict
+
+from connection_pool import ConnectionPool
 
 DB_FILE = 'gestao.db'
 
-def inicializar_banco():
-    """Inicializa o banco de dados criando as tabelas se não existirem."""
-    conn = sqlite3.connect(DB_FILE)
+# Um pool de conexões por arquivo de banco, criado no primeiro uso
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+# Chave de mês YYYY-MM de um aluguel, aceitando mes_referencia em MM/YYYY (app e Google Sheets) ou YYYY-MM;
+# NULL em qualquer outro formato. Deve corresponder a local_replica.chave_mes_aluguel
+CHAVE_MES_SQL = '''
+    CASE WHEN mes_referencia LIKE '__/____'
+         THEN substr(mes_referencia, 4, 4) || '-' || substr(mes_referencia, 1, 2)
+         WHEN mes_referencia LIKE '____-__'
+         THEN mes_referencia
+    END
+'''
+
+# Colunas devolvidas nas consultas: a coluna gerada chave_mes só serve ao índice e fica de fora
+COLUNAS_ALUGUEIS = 'id, dia_semana, mes_referencia, horario_inicio, horas_alugadas, cliente_time, valor, status, data_criacao'
+COLUNAS_TRANSACOES = 'id, data_transacao, tipo, descricao, valor, observacao, data_criacao'
+
+def criar_tabelas(conn: sqlite3.Connection):
+    """Cria as tabelas de alugueis e transações na conexão informada, se não existirem."""
     cursor = conn.cursor()
 
     cursor.execute('''
@@ -20,9 +40,16 @@ def inicializar_banco():
             cliente_time TEXT NOT NULL,
             valor REAL NOT NULL,
             status TEXT NOT NULL CHECK(status IN ('A Vencer', 'Pago', 'Em Atraso')),
-            data_criacao TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            data_criacao TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            chave_mes TEXT GENERATED ALWAYS AS ({CHAVE_MES_SQL}) VIRTUAL
         )
-    ''')
+    '''.format(CHAVE_MES_SQL=CHAVE_MES_SQL))
+
+    # Bancos criados antes da coluna chave_mes (os do schema antigo, com data_evento, não têm de onde calculá-la)
+    colunas = {row[1] for row in cursor.execute('PRAGMA table_xinfo(alugueis)')}
+    if 'chave_mes' not in colunas and 'mes_referencia' in colunas:
+        cursor.execute(f'ALTER TABLE alugueis ADD COLUMN chave_mes TEXT GENERATED ALWAYS AS ({CHAVE_MES_SQL}) VIRTUAL')
+        colunas.add('chave_mes')
 
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS transacoes (
@@ -36,47 +63,67 @@ def inicializar_banco():
         )
     ''')
 
-    conn.commit()
-    conn.close()
+    # Índices para consultas por mês e por intervalo (buscas por faixa, sem varrer a tabela)
+    if 'chave_mes' in colunas:
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_alugueis_chave_mes_status ON alugueis (chave_mes, status)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transacoes_data_tipo ON transacoes (data_transacao, tipo)')
+
+def limites_do_mes(ano: int, mes: int) -> Tuple[str, str]:
+    """Retorna o primeiro dia do mês e o do mês seguinte (YYYY-MM-DD), para filtrar datas por faixa."""
+    inicio = date(ano, mes, 1)
+    proximo = date(ano + mes // 12, mes % 12 + 1, 1)
+    return inicio.isoformat(), proximo.isoformat()
+
+def _pool() -> ConnectionPool:
+    """Retorna o pool de conexões do DB_FILE atual."""
+    with _pools_lock:
+        pool = _pools.get(DB_FILE)
+        if pool is None:
+            pool = _pools[DB_FILE] = ConnectionPool(DB_FILE)
+        return pool
+
+def obter_metricas_pool() -> dict:
+    """Retorna o estado do pool de conexões (abertas, livres, esperas) para monitoramento."""
+    return _pool().metricas()
+
+def inicializar_banco():
+    """Inicializa o banco de dados criando as tabelas se não existirem."""
+    with _pool().conexao() as conn:
+        criar_tabelas(conn)
+        conn.commit()
 
 def adicionar_aluguel(dia_semana: str, mes_referencia: str, horario_inicio: str,
                      horas_alugadas: float, cliente_time: str, valor: float, status: str) -> int:
     """Adiciona um novo registro de aluguel ao banco de dados."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    try:
-        cursor.execute('''
-            INSERT INTO alugueis (dia_semana, mes_referencia, horario_inicio, horas_alugadas, cliente_time, valor, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (dia_semana, mes_referencia, horario_inicio, horas_alugadas, cliente_time, valor, status))
-
-        conn.commit()
-        return cursor.lastrowid
-    except sqlite3.Error as e:
-        conn.rollback()
-        raise e
-    finally:
-        conn.close()
+    with _pool().conexao() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                INSERT INTO alugueis (dia_semana, mes_referencia, horario_inicio, horas_alugadas, cliente_time, valor, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (dia_semana, mes_referencia, horario_inicio, horas_alugadas, cliente_time, valor, status))
+
+            conn.commit()
+            return cursor.lastrowid
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise e
 
 def adicionar_transacao(data_transacao: str, tipo: str, descricao: str, valor: float, observacao: str = None) -> int:
     """Adiciona uma nova transação financeira ao banco de dados."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    try:
-        cursor.execute('''
-            INSERT INTO transacoes (data_transacao, tipo, descricao, valor, observacao)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (data_transacao, tipo, descricao, valor, observacao))
-
-        conn.commit()
-        return cursor.lastrowid
-    except sqlite3.Error as e:
-        conn.rollback()
-        raise e
-    finally:
-        conn.close()
+    with _pool().conexao() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                INSERT INTO transacoes (data_transacao, tipo, descricao, valor, observacao)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (data_transacao, tipo, descricao, valor, observacao))
+
+            conn.commit()
+            return cursor.lastrowid
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise e
 
 def buscar_dados_do_mes(ano: int, mes: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """Busca todos os dados de alugueis e transações para um mês/ano específico.
@@ -84,66 +131,90 @@ def buscar_dados_do_mes(ano: int, mes: int) -> Tuple[pd.DataFrame, pd.DataFrame]
     Returns:
         Tuple contendo dois DataFrames: (alugueis_df, transacoes_df)
     """
-    conn = sqlite3.connect(DB_FILE)
-
-    try:
-        alugueis_query = '''
-            SELECT * FROM alugueis
-            WHERE strftime('%Y', mes_referencia) = ? AND strftime('%m', mes_referencia) = ?
+    with _pool().conexao() as conn:
+        alugueis_query = f'''
+            SELECT {COLUNAS_ALUGUEIS} FROM alugueis
+            WHERE chave_mes = ?
             ORDER BY mes_referencia, dia_semana, horario_inicio
         '''
 
-        transacoes_query = '''
-            SELECT * FROM transacoes
-            WHERE strftime('%Y', data_transacao) = ? AND strftime('%m', data_transacao) = ?
+        # Limite superior exclusivo: datas gravadas com horário também entram no último dia
+        transacoes_query = f'''
+            SELECT {COLUNAS_TRANSACOES} FROM transacoes
+            WHERE data_transacao >= ? AND data_transacao < ?
             ORDER BY data_transacao
         '''
 
-        alugueis_df = pd.read_sql_query(alugueis_query, conn, params=(str(ano), f"{mes:02d}"))
-        transacoes_df = pd.read_sql_query(transacoes_query, conn, params=(str(ano), f"{mes:02d}"))
+        alugueis_df = pd.read_sql_query(alugueis_query, conn, params=(f"{ano}-{mes:02d}",))
+        transacoes_df = pd.read_sql_query(transacoes_query, conn, params=limites_do_mes(ano, mes))
 
         return alugueis_df, transacoes_df
-    finally:
-        conn.close()
 
-def atualizar_status_aluguel(id_aluguel: int, novo_status: str) -> bool:
-    """Atualiza o status de um aluguel específico."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+def buscar_intervalo(inicio: date, fim: date,
+                     tabelas: Tuple[str, ...] = ('alugueis', 'transacoes')) -> Dict[str, pd.DataFrame]:
+    """Busca os registros entre duas datas (inclusive) com consultas por faixa nos índices.
 
-    try:
-        cursor.execute('''
-            UPDATE alugueis SET status = ? WHERE id = ?
-        ''', (novo_status, id_aluguel))
+    Alugueis entram pelo mês de referência (todos os meses que o intervalo toca);
+    transações, pela data.
 
-        conn.commit()
-        return cursor.rowcount > 0
-    except sqlite3.Error as e:
-        conn.rollback()
-        raise e
-    finally:
-        conn.close()
+    Returns:
+        Dict {tabela: DataFrame} com as tabelas pedidas
+    """
+    with _pool().conexao() as conn:
+        resultado = {}
+        if 'alugueis' in tabelas:
+            alugueis_query = f'''
+                SELECT {COLUNAS_ALUGUEIS} FROM alugueis
+                WHERE chave_mes BETWEEN ? AND ?
+                ORDER BY chave_mes, dia_semana, horario_inicio
+            '''
+            resultado['alugueis'] = pd.read_sql_query(
+                alugueis_query, conn, params=(inicio.strftime('%Y-%m'), fim.strftime('%Y-%m'))
+            )
+
+        if 'transacoes' in tabelas:
+            # Limite superior exclusivo: datas gravadas com horário também entram no último dia
+            transacoes_query = f'''
+                SELECT {COLUNAS_TRANSACOES} FROM transacoes
+                WHERE data_transacao >= ? AND data_transacao < ?
+                ORDER BY data_transacao
+            '''
+            resultado['transacoes'] = pd.read_sql_query(
+                transacoes_query, conn, params=(inicio.isoformat(), (fim + timedelta(days=1)).isoformat())
+            )
+
+        return resultado
+
+def atualizar_status_aluguel(id_aluguel: int, novo_status: str) -> bool:
+    """Atualiza o status de um aluguel específico."""
+    with _pool().conexao() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                UPDATE alugueis SET status = ? WHERE id = ?
+            ''', (novo_status, id_aluguel))
+
+            conn.commit()
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise e
 
 def deletar_registro(tabela: str, id_registro: int) -> bool:
     """Deleta um registro específico de uma tabela."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    try:
-        cursor.execute(f'DELETE FROM {tabela} WHERE id = ?', (id_registro,))
-        conn.commit()
-        return cursor.rowcount > 0
-    except sqlite3.Error as e:
-        conn.rollback()
-        raise e
-    finally:
-        conn.close()
+    with _pool().conexao() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f'DELETE FROM {tabela} WHERE id = ?', (id_registro,))
+            conn.commit()
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise e
 
 def gerar_resumo_financeiro(ano: int, mes: int) -> dict:
     """Gera um resumo financeiro para o mês/ano especificado."""
-    conn = sqlite3.connect(DB_FILE)
-
-    try:
+    with _pool().conexao() as conn:
         alugueis_query = '''
             SELECT
                 SUM(CASE WHEN status = 'Pago' THEN valor ELSE 0 END) as total_pago,
@@ -151,7 +222,7 @@ def gerar_resumo_financeiro(ano: int, mes: int) -> dict:
                 COUNT(*) as total_alugueis,
                 SUM(horas_alugadas) as total_horas
             FROM alugueis
-            WHERE strftime('%Y', mes_referencia) = ? AND strftime('%m', mes_referencia) = ?
+            WHERE chave_mes = ?
         '''
 
         transacoes_query = '''
@@ -160,18 +231,16 @@ def gerar_resumo_financeiro(ano: int, mes: int) -> dict:
                 SUM(CASE WHEN tipo = 'Saída' THEN valor ELSE 0 END) as total_saidas,
                 COUNT(*) as total_transacoes
             FROM transacoes
-            WHERE strftime('%Y', data_transacao) = ? AND strftime('%m', data_transacao) = ?
+            WHERE data_transacao >= ? AND data_transacao < ?
         '''
 
-        alugueis_resumo = pd.read_sql_query(alugueis_query, conn, params=(str(ano), f"{mes:02d}"))
-        transacoes_resumo = pd.read_sql_query(transacoes_query, conn, params=(str(ano), f"{mes:02d}"))
+        alugueis_resumo = pd.read_sql_query(alugueis_query, conn, params=(f"{ano}-{mes:02d}",))
+        transacoes_resumo = pd.read_sql_query(transacoes_query, conn, params=limites_do_mes(ano, mes))
 
         return {
             'alugueis': alugueis_resumo.iloc[0].to_dict(),
             'transacoes': transacoes_resumo.iloc[0].to_dict()
         }
-    finally:
-        conn.close()
 
 def obter_dias_semana() -> list:
     """Retorna a lista de dias da semana para formulários."""
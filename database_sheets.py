@@ -3,11 +3,34 @@ import pandas as pd
 from datetime import datetime, date, timedelta
 from typing import Tuple, Optional, List, Dict, Any
 import json
+import random
+import re
 import streamlit as st
 import time
+import threading
+import atexit
 from google.oauth2.service_account import Credentials
 from google.auth.transport.requests import Request
 from google.auth.exceptions import GoogleAuthError
+from gspread.utils import ValueRenderOption, absolute_range_name
+from local_replica import (
+    LocalReplica, IdAllocator, COLUNAS, COLUNAS_PLANILHA, COLUNA_EXCLUSAO, RESUMO_ALUGUEIS,
+    RESUMO_TRANSACOES, RESUMO_MONETARIOS, chave_mes_aluguel, chave_mes_transacao, para_reais
+)
+from data_cache import DataCache, SingleFlight, TODOS_OS_MESES
+from rate_limiter import TokenBucket
+from change_probe import ChangeProbe, DriveModifiedTimeProbe
+
+def _agrupar_por_mes(df: pd.DataFrame, do_ano: pd.Series, meses: pd.Series) -> Tuple[pd.DataFrame, Dict[int, slice]]:
+    """Ordena as linhas do ano pelo mês (ordenação estável) e retorna a faixa de posições de cada mês."""
+    meses = meses[do_ano & meses.between(1, 12)].astype(int)
+    posicoes = meses.groupby(meses, sort=True).size().cumsum()
+    inicio = posicoes.shift(fill_value=0)
+    faixas = {int(mes): slice(int(inicio[mes]), int(fim)) for mes, fim in posicoes.items()}
+
+    ordem = meses.sort_values(kind='stable').index
+    return df.loc[ordem].reset_index(drop=True), faixas
+
 
 class GoogleSheetsDatabase:
     def __init__(self):
@@ -15,19 +38,115 @@ class GoogleSheetsDatabase:
         self.spreadsheet = None
         self.alugueis_worksheet = None
         self.transacoes_worksheet = None
+        # Optional layout with one worksheet per year ('alugueis_2025', 'transacoes_2025', ...)
+        self.particionado = False
+        self.particoes = {'alugueis': {}, 'transacoes': {}}
         self.offline_mode = False
-        self.local_data = {
-            'alugueis': [],
-            'transacoes': []
-        }
+        # Offline writes go to the local replica's write queue (kept on disk) and are replayed on reconnect
+        self.intervalo_reconexao = 60  # Seconds between reconnection attempts while offline
+        self._ultima_reconexao = 0
+        self._reenvio_pendente = True  # De-duplicate the queue against the sheet before the first flush
 
         # Cache system to reduce API calls
-        self.cache = {}
         self.cache_ttl = 60  # 1 minute cache TTL (reduced from 30 minutes)
-        self.last_api_call = 0
-        self.min_api_interval = 0.1  # Minimum seconds between API calls (reduced from 1.0s)
+        # Past cache_ttl entries are still served while a background refresh reloads them;
+        # only after cache_ttl_maximo does a read wait for Sheets again
+        self.cache_ttl_maximo = 600
+        self.cache_max_bytes = 64 * 1024 * 1024  # Memory budget for cached DataFrames
+        self.cache = DataCache(ttl=self.cache_ttl, max_bytes=self.cache_max_bytes, ttl_maximo=self.cache_ttl_maximo)
+        self.cache.iniciar_expiracao(intervalo=self.cache_ttl)
+        # Concurrent sessions asking for the same data share a single load
+        self._single_flight = SingleFlight()
+        self.min_api_interval = 0.1  # Base wait for the 429 backoff
+
+        # Token buckets matched to the Sheets per-minute quotas, shared by all threads
+        self.rate_limiter = {
+            'leitura': TokenBucket(),
+            'escrita': TokenBucket()
+        }
+
+        # Local SQLite replica: reads are served from it, syncing only new rows
+        self.replica = LocalReplica()
+        self.sync_interval = self.cache_ttl  # Seconds between incremental syncs
+        self.full_sync_interval = 900  # Full resync (catches edits made directly in the sheet)
+        self._meses_relidos = {}  # (worksheet title, first YYYY-MM, last YYYY-MM) -> last time those rows were re-read
+        self._linhas_lock = threading.Lock()  # Serializes row lookups with the updates/deletes that use them
+        # Cheap change check (Drive modifiedTime) before each sync: ranges already read at the
+        # current version are not downloaded again. Replace with LocalChangeProbe in tests.
+        self.change_probe: Optional[ChangeProbe] = DriveModifiedTimeProbe(lambda: self.spreadsheet)
+        self._versoes_lidas = {}  # (worksheet title, 'completa' | 'novas' | (first, last YYYY-MM)) -> probe version read
+        # (worksheet title, 'completa' | 'novas') -> last time the probe showed that read was not needed
+        self._leituras_conferidas = {}
+        # Worksheet title -> rows in its grid. A read starting past the grid fails with a 400,
+        # so the new-rows read only goes out when the grid has rows beyond the synced ones
+        self._linhas_grade = {}
+        self.id_allocator = IdAllocator(self.replica)
+
+        # Write-behind queue: new rows are persisted locally and appended in batches
+        self.flush_interval = 5  # Seconds between background flushes
+        self.flush_max_rows = 20  # Flush right away once this many rows are pending
+        self._flush_lock = threading.Lock()  # Taken after _linhas_lock when both are needed
+        self._flush_event = threading.Event()
+        # Appends are checked against the range returned by append_rows; this share is also re-read later
+        self.taxa_verificacao = 0.05
+        self._verificacoes_pendentes = []
+
+        # Deletes only mark rows; the flush worker rewrites the sheets without them once a day
+        self.hora_compactacao = 3  # Hour of day for compaction (None disables it)
+        self._ultima_compactacao = None
+
+        # Optional 'resumo' worksheet mirroring the local monthly summary table
+        self.publicar_resumo = False
+        self.resumo_worksheet = None
+        self._resumo_pendente = False
+
+        # Sheets handshake runs in the background so the UI renders right away;
+        # data access waits for it through _garantir_conexao
+        self._conectado = threading.Event()
+        self._conexao_lock = threading.Lock()
+        threading.Thread(target=self._conectar, daemon=True).start()
+
+        self._flush_thread = threading.Thread(target=self._loop_flush, daemon=True)
+        self._flush_thread.start()
+        atexit.register(self._flush_fila)
+
+    def _conectar(self):
+        """Autentica e configura as worksheets uma única vez, liberando quem aguarda a conexão."""
+        with self._conexao_lock:
+            if self._conectado.is_set():
+                return
+            inicio = time.monotonic()
+            try:
+                self._authenticate()
+            finally:
+                self._ultima_reconexao = time.time()
+                self._conectado.set()
+            if not self.offline_mode:
+                print(f"DEBUG: Conexão com Google Sheets pronta em {time.monotonic() - inicio:.2f}s")
+
+    def _reconectar(self) -> bool:
+        """Tenta restabelecer a conexão em modo offline; com sucesso, a fila acumulada é reenviada.
+
+        Returns:
+            True se a conexão voltou
+        """
+        with self._conexao_lock:
+            self._ultima_reconexao = time.time()
+            self._authenticate()
+            if self.offline_mode:
+                return False
+
+        print(f"DEBUG: Conexão com Google Sheets restabelecida, {self.replica.total_pendentes()} linha(s) na fila local")
+        self._reenvio_pendente = True
+        # Views built offline only had local data
+        self.cache.clear()
+        self._flush_event.set()
+        return True
 
-        self._authenticate()
+    def _garantir_conexao(self):
+        """Aguarda a conexão iniciada em segundo plano (ou conecta agora, se ela ainda não começou)."""
+        if not self._conectado.is_set():
+            self._conectar()
 
     def _authenticate(self):
         """Autentica com Google Sheets API usando service account credentials."""
@@ -56,7 +175,8 @@ class GoogleSheetsDatabase:
                 try:
                     credentials = Credentials.from_service_account_file(
                         'credentials.json',
-                        scopes=['https://www.googleapis.com/auth/spreadsheets']
+                        scopes=['https://www.googleapis.com/auth/spreadsheets',
+                                'https://www.googleapis.com/auth/drive.metadata.readonly']
                     )
                     self.client = gspread.authorize(credentials)
                 except FileNotFoundError:
@@ -82,6 +202,7 @@ class GoogleSheetsDatabase:
             # Configurar worksheets
             self._setup_worksheets()
             print("DEBUG: Worksheets configuradas com sucesso")
+            self.offline_mode = False
 
         except Exception as e:
             # Enhanced error logging
@@ -91,58 +212,66 @@ class GoogleSheetsDatabase:
             print(f"Modo offline ativado: {str(e)}")
             self.offline_mode = True
 
-    def _rate_limit(self):
-        """Implement rate limiting to avoid API quota exceeded errors."""
-        current_time = time.time()
-        time_since_last_call = current_time - self.last_api_call
+    def _rate_limit(self, escrita: bool = False):
+        """Block until the read or write token bucket has quota for one more API call."""
+        self.rate_limiter['escrita' if escrita else 'leitura'].acquire()
 
-        if time_since_last_call < self.min_api_interval:
-            sleep_time = self.min_api_interval - time_since_last_call
-            time.sleep(sleep_time)
-
-        self.last_api_call = time.time()
+    def _is_quota_error(self, e: Exception) -> bool:
+        """Check whether an API error is a quota (HTTP 429) error."""
+        response = getattr(e, 'response', None)
+        if getattr(response, 'status_code', None) == 429:
+            return True
+        return "429" in str(e) or "quota" in str(e).lower()
 
     def _get_cache_key(self, prefix: str, *args) -> str:
         """Generate a cache key."""
         return f"{prefix}_{'_'.join(str(arg) for arg in args)}"
 
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """Check if cache entry is still valid."""
-        if cache_key not in self.cache:
-            return False
+    def _cache_data(self, cache_key: str, data, deps, geracao=None):
+        """Store data in cache, recording the (table, YYYY-MM month) pairs it was built from."""
+        self.cache.set(cache_key, data, deps, geracao)
+
+    def _deps_mes(self, ano: int, mes: int) -> list:
+        """Dependencies of a single-month view (both tables, one month)."""
+        chave = f"{ano}-{mes:02d}"
+        return [('alugueis', chave), ('transacoes', chave)]
+
+    def _get_or_load(self, cache_key: str, deps, loader):
+        """Return cached data or load it, coalescing concurrent misses for the same key into one load.
+
+        Stale-while-revalidate: an entry past cache_ttl is returned as is and reloaded by the
+        cache's background worker. Only a miss (never loaded, invalidated by a write or older
+        than cache_ttl_maximo) makes the caller wait for Sheets.
+        """
+        def carregar():
+            geracao = self.cache.geracao()
+            result = loader()
+            # Dropped if another thread wrote to these months while it was loading
+            self._cache_data(cache_key, result, deps, geracao)
+            return result
 
-        cache_time, _ = self.cache[cache_key]
-        return (time.time() - cache_time) < self.cache_ttl
-
-    def _get_cached_data(self, cache_key: str):
-        """Get data from cache if valid."""
-        if self._is_cache_valid(cache_key):
-            _, data = self.cache[cache_key]
-            return data
-        return None
-
-    def _cache_data(self, cache_key: str, data):
-        """Store data in cache."""
-        self.cache[cache_key] = (time.time(), data)
-
-    def _invalidate_cache(self, pattern: str = None):
-        """Invalidate cache entries."""
-        if pattern:
-            keys_to_remove = [key for key in self.cache.keys() if pattern in key]
-            for key in keys_to_remove:
-                self.cache.pop(key, None)
-        else:
-            self.cache.clear()
+        cached_result, vencido = self.cache.consultar(cache_key)
+        if cached_result is not None:
+            if vencido and not self.offline_mode:
+                self.cache.revalidar(cache_key, lambda: self._single_flight.do(cache_key, carregar))
+            return cached_result
+
+        return self._single_flight.do(cache_key, carregar)
 
-    def _retry_with_backoff(self, func, *args, max_retries=3, **kwargs):
-        """Retry function call with exponential backoff."""
-        import random
+    def _invalidate_cache(self, tabela: str, mes: Optional[str] = None):
+        """Invalidate only the cache entries built from the given table/month (all months if mes is None)."""
+        self.cache.invalidate(tabela, mes)
+
+    def _retry_with_backoff(self, func, *args, max_retries=3, escrita=False, **kwargs):
+        """Retry function call with exponential backoff, taking a token from the read or write bucket."""
         for attempt in range(max_retries):
             try:
-                self._rate_limit()
+                self._rate_limit(escrita)
                 return func(*args, **kwargs)
             except Exception as e:
-                if "429" in str(e) or "quota" in str(e).lower():
+                if self._is_quota_error(e):
+                    # Quota is exhausted for everyone: empty the bucket so other threads queue too
+                    self.rate_limiter['escrita' if escrita else 'leitura'].esvaziar()
                     if attempt == max_retries - 1:
                         raise
 
@@ -156,24 +285,567 @@ class GoogleSheetsDatabase:
                 else:
                     raise
 
+    def _sincronizar_replica(self, forcar: bool = False, mes: Optional[str] = None, ate: Optional[str] = None,
+                             tabelas: Tuple[str, ...] = ('alugueis', 'transacoes')):
+        """Sincroniza a réplica local; sessões simultâneas aguardam a mesma sincronização.
+
+        Com mes (YYYY-MM), a sincronização completa periódica é trocada pela releitura
+        apenas das linhas daquele mês (ou dos meses de mes até ate), então abrir um mês
+        ou um intervalo não baixa o histórico inteiro.
+        """
+        ate = ate or mes
+        self._single_flight.do(
+            f"sync_{forcar}_{mes}_{ate}_{'_'.join(tabelas)}", self._executar_sincronizacao, forcar, mes, ate, tabelas
+        )
+
+    def _executar_sincronizacao(self, forcar: bool, mes: Optional[str] = None, ate: Optional[str] = None,
+                                tabelas: Tuple[str, ...] = ('alugueis', 'transacoes')):
+        """Baixa apenas as linhas novas de cada worksheet (ou tudo, na sincronização completa).
+
+        As faixas de todas as worksheets (linhas novas, linhas do mês ou a worksheet
+        inteira) são lidas juntas, numa única chamada a values_batch_get. Se houver algo
+        a ler, a sonda de alterações é consultada antes: o que já foi lido na versão
+        atual da planilha não é baixado de novo.
+        """
+        ate = ate or mes
+        worksheets = []
+        for tabela in tabelas:
+            if self.particionado and mes is not None:
+                # Os meses só podem estar nas partições dos seus anos
+                alvos = [self.particoes[tabela].get(ano) for ano in range(int(mes[:4]), int(ate[:4]) + 1)]
+            else:
+                alvos = self._worksheets_da_tabela(tabela)
+            worksheets += [(tabela, worksheet) for worksheet in alvos if worksheet is not None]
+
+        # Planejar as leituras de cada worksheet: (tabela, worksheet, tipo, linhas já sincronizadas ou intervalos)
+        plano = []
+        for tabela, worksheet in worksheets:
+            linhas, ultima_sync, ultima_sync_completa = self.replica.estado(worksheet.title)
+            agora = time.time()
+            ultima_sync_completa = max(ultima_sync_completa, self._leituras_conferidas.get((worksheet.title, 'completa'), 0))
+            ultima_sync = max(ultima_sync, self._leituras_conferidas.get((worksheet.title, 'novas'), 0))
+            completa = forcar or ultima_sync_completa == 0 or (
+                mes is None and agora - ultima_sync_completa >= self.full_sync_interval
+            )
+
+            if completa:
+                plano.append((tabela, worksheet, 'completa', None))
+                continue
+
+            if agora - ultima_sync >= self.sync_interval:
+                plano.append((tabela, worksheet, 'novas', linhas))
+
+            intervalos = self._intervalos_a_reler(worksheet, mes, ate) if mes is not None else None
+            if intervalos:
+                plano.append((tabela, worksheet, 'mes', intervalos))
+
+        # A sonda só é consultada quando há algo a baixar
+        versao = self._versao_planilha() if plano else None
+        if versao is not None and not forcar:
+            plano = [item for item in plano if not self._pular_leitura(item, versao, mes, ate)]
+        plano = self._limitar_a_grade(plano)
+
+        faixas = []
+        for tabela, worksheet, tipo, detalhe in plano:
+            ultima_coluna = self._ultima_coluna(tabela)
+            if tipo == 'completa':
+                faixas.append((worksheet, None))
+            elif tipo == 'novas':
+                # Linha 1 é o cabeçalho; buscar só o que veio depois da última linha sincronizada
+                faixas.append((worksheet, f"A{detalhe + 2}:{ultima_coluna}"))
+            else:
+                faixas += [(worksheet, f"A{inicio}:{ultima_coluna}{fim}") for inicio, fim in detalhe]
+
+        try:
+            blocos = iter(self._ler_faixas(faixas))
+        except Exception as e:
+            if 'exceeds grid limits' not in str(e):
+                raise
+            # Linhas apagadas diretamente na planilha: a grade e o índice de linhas ficaram para
+            # trás, então as worksheets do plano são relidas por inteiro (nunca passa da grade)
+            print(f"AVISO: Leitura além da grade da planilha, recarregando as worksheets: {e}")
+            self._linhas_grade.clear()
+            for tabela, worksheet in {worksheet.title: (tabela, worksheet) for tabela, worksheet, _, _ in plano}.values():
+                self._substituir_replica(tabela, worksheet)
+            plano, blocos = [], iter([])
+
+        for tabela, worksheet, tipo, detalhe in plano:
+            if tipo == 'completa':
+                self._substituir_replica(tabela, worksheet, next(blocos))
+            elif tipo == 'novas':
+                for mes_alterado in self.replica.anexar(tabela, worksheet.title, detalhe, next(blocos)):
+                    self._invalidate_cache(tabela, mes_alterado)
+            elif not self._aplicar_releitura(tabela, worksheet, mes, ate, detalhe, [next(blocos) for _ in detalhe]):
+                # O índice de linhas não confere com a planilha: recorrer à sincronização completa
+                self._substituir_replica(tabela, worksheet)
+                tipo = 'completa'
+            else:
+                tipo = (mes, ate)
+
+            if versao is not None:
+                self._versoes_lidas[(worksheet.title, tipo)] = versao
+
+        for tabela, worksheet in worksheets:
+            # Ids escritos por outro processo dentro do bloco reservado forçam um novo bloco
+            if self.id_allocator.verificar_conflito(tabela, self.replica.max_id(tabela)):
+                print(f"AVISO: Conflito de ids em {tabela}, reservando novo bloco")
+
+    def _versao_planilha(self) -> Optional[str]:
+        """Consulta a sonda de alterações; None (baixar normalmente) se ela não estiver disponível."""
+        if self.change_probe is None:
+            return None
+        try:
+            return self._retry_with_backoff(self.change_probe.versao)
+        except AttributeError as e:
+            # gspread without get_lastUpdateTime: it would fail on every sync, so stop probing
+            print(f"AVISO: Sonda de alterações desativada, não suportada por esta versão do gspread: {e}")
+            self.change_probe = None
+        except Exception as e:
+            if getattr(getattr(e, 'response', None), 'status_code', None) in (401, 403):
+                # Credentials without access to Drive metadata: stop probing
+                print(f"AVISO: Sonda de alterações desativada, sem acesso aos metadados da planilha: {e}")
+                self.change_probe = None
+            else:
+                print(f"AVISO: Falha ao consultar a sonda de alterações: {e}")
+            return None
+
+    def _limitar_a_grade(self, plano: list) -> list:
+        """Tira do plano as leituras de linhas novas de worksheets cuja grade termina na última linha sincronizada.
+
+        O tamanho das grades vem de uma única chamada de metadados, feita só quando alguma
+        worksheet parece não ter linhas novas (a grade pode ter crescido por outra instância).
+        """
+        novas = [(worksheet, linhas) for _, worksheet, tipo, linhas in plano if tipo == 'novas']
+        if any(self._linhas_grade.get(worksheet.title, 0) <= linhas + 1 for worksheet, linhas in novas):
+            self._atualizar_grades()
+
+        mantidas = []
+        for item in plano:
+            _, worksheet, tipo, linhas = item
+            # Linha 1 é o cabeçalho: há linhas novas se a grade vai além da linha linhas + 1
+            if tipo == 'novas' and self._linhas_grade.get(worksheet.title, 0) <= linhas + 1:
+                self._leituras_conferidas[(worksheet.title, 'novas')] = time.time()
+                continue
+            mantidas.append(item)
+        return mantidas
+
+    def _atualizar_grades(self):
+        """Lê o número de linhas da grade de todas as worksheets (só propriedades, sem células)."""
+        metadados = self._retry_with_backoff(
+            self.spreadsheet.fetch_sheet_metadata, {'fields': 'sheets.properties(title,gridProperties.rowCount)'}
+        )
+        for aba in metadados.get('sheets', []):
+            propriedades = aba.get('properties', {})
+            self._linhas_grade[propriedades.get('title')] = propriedades.get('gridProperties', {}).get('rowCount', 0)
+
+    def _pular_leitura(self, item: tuple, versao: str, mes: Optional[str], ate: Optional[str]) -> bool:
+        """Indica se uma leitura planejada já foi feita na versão atual da planilha.
+
+        As leituras puladas contam como feitas agora, para que a sonda não seja
+        consultada de novo antes de sync_interval.
+        """
+        _, worksheet, tipo, _ = item
+        if tipo == 'mes':
+            pular = self._inalterada(worksheet, versao, (mes, ate))
+            if pular:
+                self._meses_relidos[(worksheet.title, mes, ate)] = time.time()
+            return pular
+
+        pular = self._inalterada(worksheet, versao) if tipo == 'completa' else self._inalterada(worksheet, versao, 'novas')
+        if pular:
+            self._leituras_conferidas[(worksheet.title, tipo)] = time.time()
+        return pular
+
+    def _inalterada(self, worksheet, versao: Optional[str], *leituras) -> bool:
+        """Indica se a worksheet foi lida por inteiro, ou nas leituras dadas, na versão atual da planilha."""
+        if versao is None:
+            return False
+        return any(self._versoes_lidas.get((worksheet.title, leitura)) == versao for leitura in ('completa',) + leituras)
+
+    def _ler_faixas(self, faixas: List[Tuple[Any, Optional[str]]]) -> List[list]:
+        """Lê várias faixas (de uma ou mais worksheets) com uma única chamada a values_batch_get.
+
+        Cada item é (worksheet, faixa A1); faixa None lê a worksheet inteira, como
+        get_all_values. Os valores voltam na ordem das faixas.
+        """
+        if not faixas:
+            return []
+
+        ranges = [absolute_range_name(worksheet.title, faixa) if faixa else absolute_range_name(worksheet.title)
+                  for worksheet, faixa in faixas]
+        resposta = self._retry_with_backoff(self.spreadsheet.values_batch_get, ranges)
+        return [bloco.get('values', []) for bloco in resposta.get('valueRanges', [])]
+
+    def _substituir_replica(self, tabela: str, worksheet, dados: Optional[list] = None):
+        """Baixa a worksheet inteira (se dados não for dado) e substitui na réplica os registros que vieram dela."""
+        if dados is None:
+            dados = self._retry_with_backoff(worksheet.get_all_values)
+        ano = self._ano_da_particao(worksheet) if self.particionado else None
+        self.replica.substituir(tabela, worksheet.title, dados, ano)
+        self._invalidate_cache(tabela)
+
+    def _ano_da_particao(self, worksheet) -> Optional[int]:
+        """Ano de uma worksheet do layout particionado ('alugueis_2025' -> 2025)."""
+        partes = re.fullmatch(r'(alugueis|transacoes)_(\d{4})', worksheet.title)
+        return int(partes.group(2)) if partes else None
+
+    def _particao(self, tabela: str, mes: Optional[str], criar: bool = False):
+        """Retorna a worksheet do ano do mês (YYYY-MM) no layout particionado, criando-a se pedido.
+
+        Registros sem mês válido vão para a partição do ano corrente.
+        """
+        ano = int(mes[:4]) if mes else datetime.now().year
+        worksheet = self.particoes[tabela].get(ano)
+        if worksheet is None and criar:
+            titulo = f"{tabela}_{ano}"
+            print(f"DEBUG: Criando worksheet '{titulo}'")
+            worksheet = self.spreadsheet.add_worksheet(titulo, 1, len(COLUNAS_PLANILHA[tabela]))
+            self._retry_with_backoff(worksheet.append_row, COLUNAS_PLANILHA[tabela], escrita=True)
+            self.particoes[tabela][ano] = worksheet
+        return worksheet
+
+    def _worksheet_do_mes(self, tabela: str, mes: Optional[str], criar: bool = False):
+        """Worksheet onde ficam os registros do mês: a partição do ano ou a worksheet única."""
+        if self.particionado:
+            return self._particao(tabela, mes, criar)
+        return self.alugueis_worksheet if tabela == 'alugueis' else self.transacoes_worksheet
+
+    def _worksheets_da_tabela(self, tabela: str) -> list:
+        """Todas as worksheets com registros da tabela, em ordem de ano no layout particionado."""
+        if self.particionado:
+            return [self.particoes[tabela][ano] for ano in sorted(self.particoes[tabela])]
+        worksheet = self.alugueis_worksheet if tabela == 'alugueis' else self.transacoes_worksheet
+        return [worksheet] if worksheet is not None else []
+
+    def _worksheets_disponiveis(self) -> bool:
+        """Indica se as worksheets foram configuradas (em qualquer dos layouts)."""
+        return self.particionado or (self.alugueis_worksheet is not None and self.transacoes_worksheet is not None)
+
+    def _chave_mes_linha(self, tabela: str, row: list) -> Optional[str]:
+        """Chave de mês YYYY-MM de uma linha no formato da worksheet."""
+        if tabela == 'alugueis':
+            return chave_mes_aluguel(row[COLUNAS[tabela].index('mes_referencia')])
+        return chave_mes_transacao(row[COLUNAS[tabela].index('data_transacao')])
+
+    def _localizar_linha(self, tabela: str, worksheet, id_registro: int) -> Optional[int]:
+        """Encontra a linha do registro na worksheet (ver _localizar_linhas).
+
+        Returns:
+            Número da linha na worksheet, ou None se o registro não existir
+        """
+        return self._localizar_linhas(tabela, worksheet, [id_registro]).get(id_registro)
+
+    def _localizar_linhas(self, tabela: str, worksheet, ids: List[int]) -> Dict[int, int]:
+        """Encontra as linhas dos registros na worksheet pelo índice de linhas da réplica.
+
+        As linhas indicadas são conferidas lendo só as células de id, numa única chamada. Se
+        algum registro não estiver no índice (ainda na fila) ou uma célula não conferir
+        (planilha editada diretamente), a fila é enviada e o índice da worksheet é
+        reconstruído com uma sincronização completa.
+
+        Returns:
+            Dict {id: linha na worksheet} dos registros encontrados
+        """
+        linhas = self.replica.linhas_dos_registros(worksheet.title, ids)
+        if len(linhas) == len(set(ids)):
+            celulas = self._retry_with_backoff(worksheet.batch_get, [f"A{linha}" for linha in linhas.values()])
+            if all(celula and celula[0] and str(celula[0][0]) == str(id_registro)
+                   for id_registro, celula in zip(linhas, celulas)):
+                return linhas
+
+        print(f"DEBUG: Registro(s) fora do índice de '{worksheet.title}', reconstruindo")
+        self._flush_fila()
+        self._substituir_replica(tabela, worksheet)
+        return self.replica.linhas_dos_registros(worksheet.title, ids)
+
+    def _ultima_coluna(self, tabela: str) -> str:
+        """Letra da última coluna de dados da worksheet da tabela."""
+        return self._letra_coluna(tabela, COLUNAS_PLANILHA[tabela][-1])
+
+    def _letra_coluna(self, tabela: str, coluna: str) -> str:
+        """Letra de uma coluna na worksheet da tabela."""
+        return chr(ord('A') + COLUNAS_PLANILHA[tabela].index(coluna))
+
+    def _intervalos_a_reler(self, worksheet, mes: str, ate: Optional[str] = None) -> list:
+        """Faixas de linhas do mês (ou dos meses de mes até ate) a reler, pelo índice de linhas da réplica.
+
+        Vazio se essas linhas foram relidas há menos de sync_interval.
+        """
+        ate = ate or mes
+        if time.time() - self._meses_relidos.get((worksheet.title, mes, ate), 0) < self.sync_interval:
+            return []
+        intervalos = self.replica.intervalos_mes(worksheet.title, mes, ate)
+        if not intervalos:
+            self._meses_relidos[(worksheet.title, mes, ate)] = time.time()
+        return intervalos
+
+    def _aplicar_releitura(self, tabela: str, worksheet, mes: str, ate: Optional[str], intervalos: list,
+                           blocos: list) -> bool:
+        """Atualiza na réplica as linhas relidas do mês (as faixas de _intervalos_a_reler).
+
+        Returns:
+            False se o índice estiver desatualizado e for preciso sincronizar tudo
+        """
+        ate = ate or mes
+        meses_alterados = self.replica.atualizar_intervalos(tabela, worksheet.title, intervalos, blocos)
+        if meses_alterados is None:
+            return False
+        for mes_alterado in meses_alterados:
+            self._invalidate_cache(tabela, mes_alterado)
+
+        self._meses_relidos[(worksheet.title, mes, ate)] = time.time()
+        return True
+
+    def _enfileirar(self, tabela: str, row: list):
+        """Persiste a linha na fila local e acorda o flush se o limite foi atingido."""
+        self.replica.enfileirar(tabela, row)
+        self._resumo_pendente = True
+        if self.replica.total_pendentes() >= self.flush_max_rows:
+            self._flush_event.set()
+
+    def _flush_fila(self) -> int:
+        """Envia as linhas pendentes com um único append_rows por worksheet."""
+        # Before the connection is up there is nowhere to send rows; they stay queued
+        if not self._conectado.is_set() or self.offline_mode:
+            return 0
+
+        with self._flush_lock:
+            return self._enviar_fila()
+
+    def _enviar_fila(self) -> int:
+        """Envia as linhas pendentes (ver _flush_fila); quem chama já segura _flush_lock."""
+        if self._reenvio_pendente:
+            # Fila vinda de outra execução ou de um período offline: pode conter linhas já enviadas
+            try:
+                self._deduplicar_fila()
+            except Exception as e:
+                print(f"AVISO: Não foi possível conferir a fila local com a planilha, nova tentativa no próximo flush: {e}")
+                return 0
+            self._reenvio_pendente = False
+
+        enviadas = 0
+        for tabela, itens in self.replica.pendentes().items():
+            for worksheet, itens_aba in self._agrupar_por_worksheet(tabela, itens):
+                rows = [row for _, row in itens_aba]
+                try:
+                    resposta = self._retry_with_backoff(worksheet.append_rows, rows, escrita=True)
+                except Exception as e:
+                    print(f"AVISO: Falha ao enviar {len(rows)} linha(s) para '{worksheet.title}', nova tentativa no próximo flush: {e}")
+                    # The append may have landed before the error: check the sheet before resending
+                    self._reenvio_pendente = True
+                    continue
+
+                self.replica.confirmar([seq for seq, _ in itens_aba])
+                enviadas += len(rows)
+                self._verificar_envio(worksheet, rows, resposta)
+                self._indexar_envio(tabela, worksheet, rows, resposta)
+
+        if self.publicar_resumo and self._resumo_pendente:
+            self._publicar_resumo()
+
+        return enviadas
+
+    def _agrupar_por_worksheet(self, tabela: str, itens: List[Tuple[int, list]]) -> list:
+        """Agrupa itens (seq, linha) da fila pela worksheet de destino (no layout particionado, uma por ano).
+
+        Returns:
+            Lista de (worksheet, itens)
+        """
+        grupos = {}
+        for seq, row in itens:
+            try:
+                worksheet = self._worksheet_do_mes(tabela, self._chave_mes_linha(tabela, row), criar=True)
+            except Exception as e:
+                print(f"AVISO: Worksheet de destino indisponível para {tabela} (id {row[0]}): {e}")
+                continue
+            if worksheet is not None:
+                grupos.setdefault(worksheet.title, (worksheet, []))[1].append((seq, row))
+        return list(grupos.values())
+
+    def _deduplicar_fila(self):
+        """Confere a fila local com a planilha antes de reenviá-la.
+
+        Uma linha cujo id já está na worksheet com a mesma data_criacao já foi enviada
+        (o processo parou antes de confirmar) e sai da fila. Um id que a worksheet usa
+        para outro registro (criado por outra sessão enquanto esta estava offline) é
+        trocado por um id novo antes do envio.
+        """
+        grupos = [
+            (tabela, worksheet, itens_aba)
+            for tabela, itens in self.replica.pendentes().items()
+            for worksheet, itens_aba in self._agrupar_por_worksheet(tabela, itens)
+        ]
+        # Todas as worksheets de destino lidas numa única chamada
+        todas = self._ler_faixas([(worksheet, None) for _, worksheet, _ in grupos])
+
+        for (tabela, worksheet, itens_aba), dados in zip(grupos, todas):
+            coluna_criacao = COLUNAS[tabela].index('data_criacao')
+            na_planilha = {
+                str(row[0]): row[coluna_criacao] if len(row) > coluna_criacao else ''
+                for row in dados[1:] if row and str(row[0]).strip()
+            }
+
+            enviadas, em_conflito = [], []
+            for seq, row in itens_aba:
+                criacao = na_planilha.get(str(row[0]))
+                if criacao is None:
+                    continue
+                if criacao == str(row[coluna_criacao]):
+                    enviadas.append(seq)
+                else:
+                    em_conflito.append(seq)
+
+            if enviadas:
+                print(f"DEBUG: {len(enviadas)} linha(s) da fila já estavam em '{worksheet.title}'")
+                self.replica.confirmar(enviadas)
+            if em_conflito:
+                maior_id = max((int(id_) for id_ in na_planilha if id_.isdigit()), default=0)
+                self.replica.elevar_marca_id(tabela, maior_id)
+                self.id_allocator.verificar_conflito(tabela, maior_id)
+                for seq in em_conflito:
+                    self.replica.renumerar_pendente(seq, self.id_allocator.proximo(tabela))
+                print(f"AVISO: {len(em_conflito)} linha(s) da fila receberam novos ids por conflito em '{worksheet.title}'")
+
+            if enviadas or em_conflito:
+                # Réplica refeita a partir da planilha já lida, com a fila reaplicada por cima
+                self._substituir_replica(tabela, worksheet, dados)
+
+    def _publicar_resumo(self):
+        """Reescreve a worksheet 'resumo' com o resumo mensal local, numa única chamada."""
+        try:
+            if self.resumo_worksheet is None:
+                try:
+                    self.resumo_worksheet = self.spreadsheet.worksheet("resumo")
+                except gspread.exceptions.WorksheetNotFound:
+                    self.resumo_worksheet = self.spreadsheet.add_worksheet("resumo", 1, 8)
+
+            # Cleared up front: a failed publish waits for the next change instead of retrying every tick
+            self._resumo_pendente = False
+            colunas = ['mes'] + RESUMO_ALUGUEIS + RESUMO_TRANSACOES
+            # A réplica guarda centavos; a planilha mostra reais
+            valores = [colunas]
+            valores += [
+                [para_reais(valor) if coluna in RESUMO_MONETARIOS else valor for coluna, valor in zip(colunas, row)]
+                for row in self.replica.resumos()
+            ]
+            # The grid must fit every row before the write; resizing also drops months left over from a larger summary
+            worksheet = self.resumo_worksheet
+            if worksheet.row_count != len(valores) or worksheet.col_count != len(colunas):
+                self._retry_with_backoff(worksheet.resize, rows=len(valores), cols=len(colunas), escrita=True)
+            self._retry_with_backoff(worksheet.update, range_name='A1', values=valores, escrita=True)
+        except Exception as e:
+            print(f"AVISO: Não foi possível publicar a worksheet de resumo: {e}")
+
+    def _loop_flush(self):
+        """Background worker: flushes the write-behind queue on a timer or when signalled."""
+        self._conectado.wait()
+        while True:
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            if self.offline_mode:
+                if time.time() - self._ultima_reconexao < self.intervalo_reconexao or not self._reconectar():
+                    continue
+            try:
+                self._flush_fila()
+            except Exception as e:
+                print(f"AVISO: Erro no flush da fila de escrita: {e}")
+            self._executar_verificacoes()
+            try:
+                self._compactar_se_agendado()
+            except Exception as e:
+                print(f"AVISO: Erro na compactação das worksheets: {e}")
+
+    def _compactar_se_agendado(self):
+        """Roda a compactação uma vez por dia, na hora configurada em hora_compactacao."""
+        agora = datetime.now()
+        if self.hora_compactacao is None or agora.hour != self.hora_compactacao:
+            return
+        if self._ultima_compactacao == agora.date():
+            return
+
+        # Marcar antes de rodar para não repetir a cada flush se falhar
+        self._ultima_compactacao = agora.date()
+        removidas = self.compactar()
+        if removidas:
+            print(f"DEBUG: Compactação removeu linhas excluídas: {removidas}")
+
+    def _verificar_envio(self, worksheet, rows: list, resposta: dict):
+        """Confere pelo retorno do append_rows quantas linhas a planilha gravou.
+
+        Uma fração (taxa_verificacao) dos envios ainda é relida depois, pelo worker de
+        flush, mas só no intervalo informado em updates.updatedRange.
+        """
+        updates = (resposta or {}).get('updates', {})
+        if updates.get('updatedRows') != len(rows):
+            print(f"AVISO: '{worksheet.title}' confirmou {updates.get('updatedRows')} de {len(rows)} linha(s) enviadas")
+            return
+
+        if self.taxa_verificacao and random.random() < self.taxa_verificacao:
+            intervalo = updates['updatedRange'].split('!')[-1]
+            self._verificacoes_pendentes.append((worksheet, intervalo, [str(row[0]) for row in rows]))
+
+    def _indexar_envio(self, tabela: str, worksheet, rows: list, resposta: dict):
+        """Registra no índice de linhas da réplica onde o append_rows gravou as linhas (updates.updatedRange).
+
+        Assim atualizações e exclusões de registros recém-enviados encontram a linha pelo
+        índice, sem reconstruí-lo com uma leitura completa da worksheet.
+        """
+        updates = (resposta or {}).get('updates', {})
+        inicio = re.match(r'[A-Z]+(\d+)', updates.get('updatedRange', '').split('!')[-1])
+        if inicio is None or updates.get('updatedRows') != len(rows):
+            return
+        # append_rows estende a grade até a última linha gravada
+        ultima_linha = int(inicio.group(1)) + len(rows) - 1
+        self._linhas_grade[worksheet.title] = max(self._linhas_grade.get(worksheet.title, 0), ultima_linha)
+        try:
+            self.replica.indexar_enviadas(tabela, worksheet.title, int(inicio.group(1)), rows)
+        except Exception as e:
+            # Só o índice fica para trás: a próxima busca pela linha reconstrói o índice
+            print(f"AVISO: Não foi possível indexar as linhas enviadas para '{worksheet.title}': {e}")
+
+    def _executar_verificacoes(self):
+        """Relê os intervalos de envios sorteados e confere se os ids gravados são os enviados."""
+        while self._verificacoes_pendentes:
+            worksheet, intervalo, ids = self._verificacoes_pendentes.pop(0)
+            try:
+                gravadas = self._retry_with_backoff(worksheet.get, intervalo)
+                ids_gravados = [str(row[0]) if row else '' for row in gravadas]
+                if ids_gravados != ids:
+                    print(f"AVISO: Verificação de consistência falhou em '{worksheet.title}'!{intervalo}")
+            except Exception as e:
+                print(f"AVISO: Não foi possível verificar consistência de '{worksheet.title}'!{intervalo}: {e}")
+
     def _setup_worksheets(self):
         """Configura as worksheets necessárias."""
         try:
             print("DEBUG: Configurando worksheets...")
 
+            # Layout particionado: uma worksheet por ano e tabela, criada por migrate_partitions.py
+            for worksheet in self.spreadsheet.worksheets():
+                ano = self._ano_da_particao(worksheet)
+                if ano is not None:
+                    self.particoes[worksheet.title.rsplit('_', 1)[0]][ano] = worksheet
+            self.particionado = any(self.particoes.values())
+            if self.particionado and not all(self.particoes.values()):
+                # Só uma das tabelas tem partições: gravar aqui espalharia registros entre os dois layouts
+                raise Exception(
+                    "Planilha com migração incompleta: há worksheets por ano de apenas uma tabela. "
+                    "Remova as worksheets por ano criadas e execute migrate_partitions.py novamente."
+                )
+            if self.particionado:
+                print(f"DEBUG: Layout particionado por ano: {sorted(set(self.particoes['alugueis']) | set(self.particoes['transacoes']))}")
+                self._garantir_coluna_exclusao()
+                return
+
             # Worksheet de alugueis
             try:
                 self.alugueis_worksheet = self.spreadsheet.worksheet("alugueis")
                 print("DEBUG: Worksheet 'alugueis' encontrada")
             except gspread.exceptions.WorksheetNotFound:
                 print("DEBUG: Worksheet 'alugueis' não encontrada, criando...")
-                self.alugueis_worksheet = self.spreadsheet.add_worksheet("alugueis", 1, 9)
+                self.alugueis_worksheet = self.spreadsheet.add_worksheet("alugueis", 1, len(COLUNAS_PLANILHA['alugueis']))
                 # Cabeçalhos para alugueis
-                headers_alugueis = [
-                    'id', 'dia_semana', 'mes_referencia', 'horario_inicio',
-                    'horas_alugadas', 'cliente_time', 'valor', 'status', 'data_criacao'
-                ]
-                self.alugueis_worksheet.append_row(headers_alugueis)
+                self.alugueis_worksheet.append_row(COLUNAS_PLANILHA['alugueis'])
                 print("DEBUG: Worksheet 'alugueis' criada com cabeçalhos")
 
             # Worksheet de transacoes
@@ -182,14 +854,12 @@ class GoogleSheetsDatabase:
                 print("DEBUG: Worksheet 'transacoes' encontrada")
             except gspread.exceptions.WorksheetNotFound:
                 print("DEBUG: Worksheet 'transacoes' não encontrada, criando...")
-                self.transacoes_worksheet = self.spreadsheet.add_worksheet("transacoes", 1, 6)
+                self.transacoes_worksheet = self.spreadsheet.add_worksheet("transacoes", 1, len(COLUNAS_PLANILHA['transacoes']))
                 # Cabeçalhos para transacoes
-                headers_transacoes = [
-                    'id', 'data_transacao', 'tipo', 'descricao', 'valor', 'observacao', 'data_criacao'
-                ]
-                self.transacoes_worksheet.append_row(headers_transacoes)
+                self.transacoes_worksheet.append_row(COLUNAS_PLANILHA['transacoes'])
                 print("DEBUG: Worksheet 'transacoes' criada com cabeçalhos")
 
+            self._garantir_coluna_exclusao()
             print("DEBUG: Worksheets configuradas com sucesso")
 
         except Exception as e:
@@ -197,256 +867,102 @@ class GoogleSheetsDatabase:
             print(f"DEBUG ERRO: Tipo de erro: {type(e).__name__}")
             raise Exception(f"Erro ao configurar worksheets: {str(e)}")
 
-    def _get_next_id(self, worksheet) -> int:
-        """Gera próximo ID para uma worksheet."""
-        try:
-            if worksheet is None:
-                return 1
-
-            # Use cached data if available
-            cache_key = self._get_cache_key("next_id", id(worksheet))
-            cached_id = self._get_cached_data(cache_key)
-            if cached_id:
-                return cached_id
-
-            # Get data with retry logic - use batch_get for better performance
-            try:
-                # Try to get just the first column with IDs
-                id_range = f"A2:A{worksheet.row_count}"  # Get all IDs from column A
-                id_data = self._retry_with_backoff(worksheet.batch_get, [id_range])
-
-                if id_data and id_data[0]:
-                    max_id = 0
-                    for row in id_data[0]:
-                        if row and row[0] and row[0].isdigit():
-                            max_id = max(max_id, int(row[0]))
-                    next_id = max_id + 1
-                else:
-                    next_id = 1
-            except:
-                # Fallback to get_all_values if batch_get fails
-                data = self._retry_with_backoff(worksheet.get_all_values)
-                if len(data) <= 1:  # Apenas cabeçalho
-                    next_id = 1
-                else:
-                    # Encontrar maior ID existente
-                    max_id = 0
-                    for row in data[1:]:  # Pular cabeçalho
-                        if row and row[0].isdigit():
-                            max_id = max(max_id, int(row[0]))
-                    next_id = max_id + 1
-
-            # Cache the result
-            self._cache_data(cache_key, next_id)
-            return next_id
-        except:
-            return 1
+    def _garantir_coluna_exclusao(self):
+        """Acrescenta a coluna excluido_em, com cabeçalho, às worksheets criadas antes dela.
+
+        As leituras vão até essa coluna; sem ela na grade, a API recusaria as faixas.
+        """
+        worksheets = [(tabela, worksheet) for tabela in ('alugueis', 'transacoes')
+                      for worksheet in self._worksheets_da_tabela(tabela)]
+        for tabela, worksheet in worksheets:
+            if worksheet.col_count < len(COLUNAS_PLANILHA[tabela]):
+                print(f"DEBUG: Acrescentando a coluna '{COLUNA_EXCLUSAO}' à worksheet '{worksheet.title}'")
+                self._retry_with_backoff(worksheet.add_cols, len(COLUNAS_PLANILHA[tabela]) - worksheet.col_count,
+                                         escrita=True)
+
+        # Cabeçalhos de todas as worksheets numa única leitura
+        cabecalhos = self._ler_faixas([(worksheet, f"A1:{self._ultima_coluna(tabela)}1")
+                                       for tabela, worksheet in worksheets])
+        for (tabela, worksheet), cabecalho in zip(worksheets, cabecalhos):
+            indice = COLUNAS_PLANILHA[tabela].index(COLUNA_EXCLUSAO)
+            linha = cabecalho[0] if cabecalho else []
+            if len(linha) <= indice or not linha[indice]:
+                self._retry_with_backoff(worksheet.update, range_name=f"{self._letra_coluna(tabela, COLUNA_EXCLUSAO)}1",
+                                         values=[[COLUNA_EXCLUSAO]], escrita=True)
+
+    def _get_next_id(self, tabela: str) -> int:
+        """Gera próximo ID para uma tabela a partir do bloco reservado localmente."""
+        # Antes de reservar um novo bloco, trazer os ids mais recentes da planilha (offline, vale a réplica)
+        if not self.offline_mode and not self.id_allocator.tem_bloco(tabela):
+            self._sincronizar_replica()
+
+        return self.id_allocator.proximo(tabela)
 
     def adicionar_aluguel(self, dia_semana: str, mes_referencia: str, horario_inicio: str,
                          horas_alugadas: float, cliente_time: str, valor: float, status: str) -> int:
         """Adiciona um novo registro de aluguel ao Google Sheets."""
+        self._garantir_conexao()
         try:
-            if self.offline_mode:
-                # Modo offline - salvar em memória
-                next_id = len(self.local_data['alugueis']) + 1
-                data_criacao = datetime.now().isoformat()
-
-                aluguel = {
-                    'id': next_id,
-                    'dia_semana': dia_semana,
-                    'mes_referencia': mes_referencia,
-                    'horario_inicio': horario_inicio,
-                    'horas_alugadas': horas_alugadas,
-                    'cliente_time': cliente_time,
-                    'valor': valor,
-                    'status': status,
-                    'data_criacao': data_criacao
-                }
-
-                self.local_data['alugueis'].append(aluguel)
-                return next_id
-            else:
-                # Modo online - Google Sheets
-                next_id = self._get_next_id(self.alugueis_worksheet)
-                data_criacao = datetime.now().isoformat()
+            next_id = self._get_next_id('alugueis')
+            data_criacao = datetime.now().isoformat()
 
-                row = [
-                    next_id, dia_semana, mes_referencia, horario_inicio,
-                    horas_alugadas, cliente_time, valor, status, data_criacao
-                ]
+            row = [
+                next_id, dia_semana, mes_referencia, horario_inicio,
+                horas_alugadas, cliente_time, valor, status, data_criacao
+            ]
 
-                # Use retry logic for append operation - try batch_append if available
-                try:
-                    # Try to use batch append for better performance
-                    self._retry_with_backoff(self.alugueis_worksheet.append_rows, [row])
-                except AttributeError:
-                    # Fallback to single row append if batch_append not available
-                    self._retry_with_backoff(self.alugueis_worksheet.append_row, row)
-
-                # Invalidate cache when adding new data
-                self._invalidate_cache("alugueis")
-                self._invalidate_cache("transacoes")
-                self._invalidate_cache("next_id")
-                self._invalidate_cache("resumo")
-                self._invalidate_cache("dados_mes")
-                self._invalidate_cache("todos_dados")
-                self._invalidate_cache("sidebar_resumo")
-
-                return next_id
+            # Gravar localmente; o envio à planilha é feito em lote pelo flush
+            # (em modo offline, a fila fica em disco até a conexão voltar)
+            self._enfileirar('alugueis', row)
+
+            # Invalidate only the views of this rental's month
+            self._invalidate_cache('alugueis', chave_mes_aluguel(mes_referencia))
+
+            return next_id
         except Exception as e:
             raise Exception(f"Erro ao adicionar aluguel: {str(e)}")
 
     def adicionar_transacao(self, data_transacao: str, tipo: str, descricao: str,
                            valor: float, observacao: str = None) -> int:
         """Adiciona uma nova transação financeira ao Google Sheets."""
+        self._garantir_conexao()
         try:
-            if self.offline_mode:
-                # Modo offline - salvar em memória
-                next_id = len(self.local_data['transacoes']) + 1
-                data_criacao = datetime.now().isoformat()
-
-                transacao = {
-                    'id': next_id,
-                    'data_transacao': data_transacao,
-                    'tipo': tipo,
-                    'descricao': descricao,
-                    'valor': valor,
-                    'observacao': observacao or '',
-                    'data_criacao': data_criacao
-                }
-
-                self.local_data['transacoes'].append(transacao)
-                return next_id
-            else:
-                # Modo online - Google Sheets
-                next_id = self._get_next_id(self.transacoes_worksheet)
-                data_criacao = datetime.now().isoformat()
+            next_id = self._get_next_id('transacoes')
+            data_criacao = datetime.now().isoformat()
 
-                row = [next_id, data_transacao, tipo, descricao, valor, observacao or '', data_criacao]
+            row = [next_id, data_transacao, tipo, descricao, valor, observacao or '', data_criacao]
 
-                # Use retry logic for append operation - try batch_append if available
-                try:
-                    # Try to use batch append for better performance
-                    self._retry_with_backoff(self.transacoes_worksheet.append_rows, [row])
-                except AttributeError:
-                    # Fallback to single row append if batch_append not available
-                    self._retry_with_backoff(self.transacoes_worksheet.append_row, row)
-
-                # Invalidate cache when adding new data
-                self._invalidate_cache("transacoes")
-                self._invalidate_cache("alugueis")
-                self._invalidate_cache("next_id")
-                self._invalidate_cache("resumo")
-                self._invalidate_cache("dados_mes")
-                self._invalidate_cache("todos_dados")
-                self._invalidate_cache("sidebar_resumo")
-
-                # Verificação de consistência - tentar ler a transação recém-adicionada
-                try:
-                    time.sleep(0.2)  # Pequeno delay para garantir processamento
-                    verification_data = self._retry_with_backoff(self.transacoes_worksheet.get_all_values)
-                    if len(verification_data) > 1:
-                        # Verificar se a última linha corresponde à transação adicionada
-                        last_row = verification_data[-1]
-                        if (len(last_row) >= 4 and
-                            last_row[2] == tipo and  # coluna tipo
-                            last_row[3] == descricao and  # coluna descrição
-                            str(last_row[4]) == str(valor)):  # coluna valor
-                            pass  # Verificação bem-sucedida
-                        else:
-                            print(f"AVISO: Verificação de consistência falhou para transação {next_id}")
-                except:
-                    print("AVISO: Não foi possível verificar consistência da transação adicionada")
-
-                return next_id
+            # Gravar localmente; o envio à planilha é feito em lote pelo flush
+            # (em modo offline, a fila fica em disco até a conexão voltar)
+            self._enfileirar('transacoes', row)
+
+            # Invalidate only the views of this transaction's month
+            self._invalidate_cache('transacoes', chave_mes_transacao(data_transacao))
+
+            return next_id
         except Exception as e:
             raise Exception(f"Erro ao adicionar transação: {str(e)}")
 
     def buscar_dados_do_mes(self, ano: int, mes: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """Busca todos os dados de alugueis e transações para um mês/ano específico."""
+        self._garantir_conexao()
         try:
             if self.offline_mode:
-                # Modo offline - usar dados locais
-                mes_ano_str = f"{mes:02d}/{ano}"
-
-                # Filtrar alugueis
-                alugueis_filtrados = [a for a in self.local_data['alugueis'] if a.get('mes_referencia') == mes_ano_str]
-                alugueis_df = pd.DataFrame(alugueis_filtrados)
-
-                if alugueis_df.empty:
-                    alugueis_df = pd.DataFrame(columns=[
-                        'id', 'dia_semana', 'mes_referencia', 'horario_inicio',
-                        'horas_alugadas', 'cliente_time', 'valor', 'status', 'data_criacao'
-                    ])
-
-                # Filtrar transações
-                transacoes_filtradas = [t for t in self.local_data['transacoes']]
-                transacoes_df = pd.DataFrame(transacoes_filtradas)
-
-                if not transacoes_df.empty:
-                    transacoes_df['data_transacao'] = pd.to_datetime(transacoes_df['data_transacao'], errors='coerce')
-                    mask = (transacoes_df['data_transacao'].dt.year == ano) & \
-                           (transacoes_df['data_transacao'].dt.month == mes)
-                    transacoes_df = transacoes_df[mask]
-                else:
-                    transacoes_df = pd.DataFrame(columns=[
-                        'id', 'data_transacao', 'tipo', 'descricao', 'valor', 'observacao', 'data_criacao'
-                    ])
-
-                return alugueis_df, transacoes_df
+                # Modo offline - ler da réplica local, com as linhas ainda na fila
+                return self.replica.consultar_mes(ano, mes)
             else:
-                # Check cache first
-                cache_key = self._get_cache_key("dados_mes", ano, mes)
-                cached_result = self._get_cached_data(cache_key)
-                if cached_result:
-                    return cached_result
-
                 # Modo online - Google Sheets com otimização
-                if self.alugueis_worksheet is None or self.transacoes_worksheet is None:
+                if not self._worksheets_disponiveis():
                     raise Exception("Worksheets não disponíveis. Verifique a conexão com Google Sheets.")
 
-                # Buscar dados com retry logic e rate limiting
-                alugueis_data = self._retry_with_backoff(self.alugueis_worksheet.get_all_values)
-                transacoes_data = self._retry_with_backoff(self.transacoes_worksheet.get_all_values)
-
-                # Converter para DataFrame
-                if len(alugueis_data) > 1:
-                    alugueis_df = pd.DataFrame(alugueis_data[1:], columns=alugueis_data[0])
-                    # Filtrar por mês/ano (usando mes_referencia para alugueis)
-                    mes_ano_str = f"{mes:02d}/{ano}"
-                    alugueis_df = alugueis_df[alugueis_df['mes_referencia'] == mes_ano_str]
-
-                    # Converter colunas numéricas para tipos corretos
-                    alugueis_df['valor'] = pd.to_numeric(alugueis_df['valor'], errors='coerce').fillna(0)
-                    alugueis_df['horas_alugadas'] = pd.to_numeric(alugueis_df['horas_alugadas'], errors='coerce').fillna(0)
-                    alugueis_df['id'] = pd.to_numeric(alugueis_df['id'], errors='coerce').fillna(0).astype(int)
-                else:
-                    alugueis_df = pd.DataFrame(columns=[
-                        'id', 'dia_semana', 'mes_referencia', 'horario_inicio',
-                        'horas_alugadas', 'cliente_time', 'valor', 'status', 'data_criacao'
-                    ])
-
-                if len(transacoes_data) > 1:
-                    transacoes_df = pd.DataFrame(transacoes_data[1:], columns=transacoes_data[0])
-                    # Filtrar por mês/ano
-                    transacoes_df['data_transacao'] = pd.to_datetime(transacoes_df['data_transacao'], errors='coerce')
-                    mask = (transacoes_df['data_transacao'].dt.year == ano) & \
-                           (transacoes_df['data_transacao'].dt.month == mes)
-                    transacoes_df = transacoes_df[mask]
-
-                    # Converter colunas numéricas para tipos corretos
-                    transacoes_df['valor'] = pd.to_numeric(transacoes_df['valor'], errors='coerce').fillna(0)
-                    transacoes_df['id'] = pd.to_numeric(transacoes_df['id'], errors='coerce').fillna(0).astype(int)
-                else:
-                    transacoes_df = pd.DataFrame(columns=[
-                        'id', 'data_transacao', 'tipo', 'descricao', 'valor', 'observacao', 'data_criacao'
-                    ])
+                def carregar():
+                    # Sincronizar as linhas novas e as do mês e ler o mês da réplica local
+                    self._sincronizar_replica(mes=f"{ano}-{mes:02d}")
+                    # Colunas já tipadas pela réplica (decodificar)
+                    return self.replica.consultar_mes(ano, mes)
 
-                # Cache the result
-                result = (alugueis_df, transacoes_df)
-                self._cache_data(cache_key, result)
-
-                return result
+                cache_key = self._get_cache_key("dados_mes", ano, mes)
+                return self._get_or_load(cache_key, self._deps_mes(ano, mes), carregar)
 
         except Exception as e:
             # Check for quota/429 errors and provide better error message
@@ -456,129 +972,122 @@ class GoogleSheetsDatabase:
 
     def atualizar_status_aluguel(self, id_aluguel: int, novo_status: str) -> bool:
         """Atualiza o status de um aluguel específico."""
+        self._garantir_conexao()
         try:
-            if self.alugueis_worksheet is None:
+            mes_aluguel = self.replica.chave_mes('alugueis', id_aluguel)
+            worksheet = self._worksheet_do_mes('alugueis', mes_aluguel)
+            if worksheet is None and self.particionado:
+                # Nenhuma partição do ano do registro: ele não existe
+                return False
+            if worksheet is None:
                 print("DEBUG ERRO: Worksheet 'alugueis' é None - não foi inicializada corretamente")
                 print(f"DEBUG ERRO: Modo offline: {self.offline_mode}")
                 raise Exception("Worksheet de alugueis não disponível. Verifique a conexão com Google Sheets.")
             print(f"DEBUG: Atualizando status do aluguel {id_aluguel} para '{novo_status}'")
 
-            # Get data with retry logic - try selective reading first
-            try:
-                # Try to find the row with matching ID using batch_get
-                id_range = f"A2:A{self.alugueis_worksheet.row_count}"  # Get all IDs
-                id_data = self._retry_with_backoff(self.alugueis_worksheet.batch_get, [id_range])
-
-                if id_data and id_data[0]:
-                    for i, row in enumerate(id_data[0], start=2):
-                        if row and row[0] == str(id_aluguel):
-                            # Found the row, now update it
-                            headers = ['id', 'dia_semana', 'mes_referencia', 'horario_inicio', 'horas_alugadas', 'cliente_time', 'valor', 'status', 'data_criacao']
-                            status_col = headers.index('status')
-
-                            # Use retry logic for update operation
-                            self._retry_with_backoff(self.alugueis_worksheet.update_cell, i, status_col + 1, novo_status)
-
-                            # Invalidate cache when updating data
-                            self._invalidate_cache("alugueis")
-                            self._invalidate_cache("transacoes")
-                            self._invalidate_cache("dados_mes")
-                            self._invalidate_cache("resumo")
-                            self._invalidate_cache("todos_dados")
-                            self._invalidate_cache("next_id")
-                            self._invalidate_cache("sidebar_resumo")
-
-                            return True
-            except:
-                # Fallback to full scan if batch_get fails
-                data = self._retry_with_backoff(self.alugueis_worksheet.get_all_values)
-                if len(data) <= 1:
+            with self._linhas_lock:
+                # Linha do registro pelo índice da réplica, sem varrer a coluna de ids
+                linha = self._localizar_linha('alugueis', worksheet, id_aluguel)
+                if linha is None:
                     return False
 
-                headers = data[0]
-                id_col = headers.index('id')
-                status_col = headers.index('status')
+                status_col = COLUNAS['alugueis'].index('status')
+                self._retry_with_backoff(worksheet.update_cell, linha, status_col + 1, novo_status, escrita=True)
+                self.replica.atualizar_status(id_aluguel, novo_status)
+            self._resumo_pendente = True
 
-                for i, row in enumerate(data[1:], start=2):  # Começar da linha 2
-                    if row[id_col] == str(id_aluguel):
-                        # Use retry logic for update operation
-                        self._retry_with_backoff(self.alugueis_worksheet.update_cell, i, status_col + 1, novo_status)
+            # Invalidate only the views of this rental's month
+            self._invalidate_cache('alugueis', mes_aluguel)
 
-                        # Invalidate cache when updating data
-                        self._invalidate_cache("alugueis")
-                        self._invalidate_cache("transacoes")
-                        self._invalidate_cache("dados_mes")
-                        self._invalidate_cache("resumo")
-                        self._invalidate_cache("todos_dados")
-                        self._invalidate_cache("next_id")
-                        self._invalidate_cache("sidebar_resumo")
+            return True
+        except Exception as e:
+            # Check for quota/429 errors and provide better error message
+            if "429" in str(e) or "quota" in str(e).lower():
+                raise Exception(f"Limite da API atingido. Tente novamente em alguns instantes. Erro: {str(e)}")
+            raise Exception(f"Erro ao atualizar status: {str(e)}")
 
-                        return True
+    def atualizar_status_em_lote(self, ids: List[int], novo_status: str) -> int:
+        """Atualiza o status de vários aluguéis com um único batch_update por worksheet.
 
-            return False
+        Returns:
+            Quantidade de aluguéis atualizados
+        """
+        self._garantir_conexao()
+        try:
+            if not self._worksheets_disponiveis():
+                raise Exception("Worksheet de alugueis não disponível. Verifique a conexão com Google Sheets.")
+            print(f"DEBUG: Atualizando status de {len(ids)} aluguel(is) para '{novo_status}'")
+
+            # Agrupar por worksheet (no layout particionado, uma por ano)
+            grupos = {}
+            meses = set()
+            for id_aluguel in ids:
+                mes_aluguel = self.replica.chave_mes('alugueis', id_aluguel)
+                worksheet = self._worksheet_do_mes('alugueis', mes_aluguel)
+                if worksheet is not None:
+                    grupos.setdefault(worksheet.title, (worksheet, []))[1].append(id_aluguel)
+                    meses.add(mes_aluguel)
+
+            status_col = self._letra_coluna('alugueis', 'status')
+            atualizados = 0
+            with self._linhas_lock:
+                for worksheet, ids_aba in grupos.values():
+                    linhas = self._localizar_linhas('alugueis', worksheet, ids_aba)
+                    if not linhas:
+                        continue
+
+                    self._retry_with_backoff(worksheet.batch_update, [
+                        {'range': f"{status_col}{linha}", 'values': [[novo_status]]}
+                        for linha in linhas.values()
+                    ], escrita=True)
+                    self.replica.atualizar_status_em_lote(list(linhas), novo_status)
+                    atualizados += len(linhas)
+
+            if atualizados:
+                self._resumo_pendente = True
+                # Invalidate only the views of the affected months
+                for mes_aluguel in meses:
+                    self._invalidate_cache('alugueis', mes_aluguel)
+
+            return atualizados
         except Exception as e:
             # Check for quota/429 errors and provide better error message
             if "429" in str(e) or "quota" in str(e).lower():
                 raise Exception(f"Limite da API atingido. Tente novamente em alguns instantes. Erro: {str(e)}")
-            raise Exception(f"Erro ao atualizar status: {str(e)}")
+            raise Exception(f"Erro ao atualizar status em lote: {str(e)}")
 
     def deletar_registro(self, tabela: str, id_registro: int) -> bool:
         """Deleta um registro específico de uma tabela."""
+        self._garantir_conexao()
         try:
-            if tabela == 'alugueis':
-                worksheet = self.alugueis_worksheet
-                cache_pattern = "alugueis"
-            elif tabela == 'transacoes':
-                worksheet = self.transacoes_worksheet
-                cache_pattern = "transacoes"
-            else:
+            if tabela not in ('alugueis', 'transacoes'):
                 return False
 
+            mes_registro = self.replica.chave_mes(tabela, id_registro)
+            worksheet = self._worksheet_do_mes(tabela, mes_registro)
+            if worksheet is None and self.particionado:
+                # Nenhuma partição do ano do registro: ele não existe
+                return False
             if worksheet is None:
                 raise Exception("Worksheet não disponível. Verifique a conexão com Google Sheets.")
 
-            # Get data with retry logic - try selective reading first
-            try:
-                # Try to find the row with matching ID using batch_get
-                id_range = f"A2:A{worksheet.row_count}"  # Get all IDs
-                id_data = self._retry_with_backoff(worksheet.batch_get, [id_range])
-
-                if id_data and id_data[0]:
-                    for i, row in enumerate(id_data[0], start=2):
-                        if row and row[0] == str(id_registro):
-                            # Found the row, now delete it
-                            self._retry_with_backoff(worksheet.delete_rows, i)
-
-                            # Invalidate cache when deleting data
-                            self._invalidate_cache(cache_pattern)
-                            self._invalidate_cache("dados_mes")
-                            self._invalidate_cache("resumo")
-                            self._invalidate_cache("next_id")
-
-                            return True
-            except:
-                # Fallback to full scan if batch_get fails
-                data = self._retry_with_backoff(worksheet.get_all_values)
-                if len(data) <= 1:
+            with self._linhas_lock:
+                # Linha do registro pelo índice da réplica, sem varrer a coluna de ids
+                linha = self._localizar_linha(tabela, worksheet, id_registro)
+                if linha is None:
                     return False
 
-                headers = data[0]
-                id_col = headers.index('id')
+                # Exclusão lógica: a linha fica na worksheet até a compactação, sem deslocar as demais
+                coluna = self._letra_coluna(tabela, COLUNA_EXCLUSAO)
+                self._retry_with_backoff(worksheet.update, range_name=f"{coluna}{linha}",
+                                         values=[[datetime.now().isoformat()]], escrita=True)
+                self.replica.marcar_excluido(tabela, worksheet.title, id_registro)
+            self._resumo_pendente = True
 
-                for i, row in enumerate(data[1:], start=2):
-                    if row[id_col] == str(id_registro):
-                        # Use retry logic for delete operation
-                        self._retry_with_backoff(worksheet.delete_rows, i)
+            # Invalidate only the views of this record's month
+            self._invalidate_cache(tabela, mes_registro)
 
-                        # Invalidate cache when deleting data
-                        self._invalidate_cache(cache_pattern)
-                        self._invalidate_cache("dados_mes")
-                        self._invalidate_cache("resumo")
-                        self._invalidate_cache("next_id")
-
-                        return True
-
-            return False
+            return True
         except Exception as e:
             # Check for quota/429 errors and provide better error message
             if "429" in str(e) or "quota" in str(e).lower():
@@ -587,50 +1096,20 @@ class GoogleSheetsDatabase:
 
     def gerar_resumo_financeiro(self, ano: int, mes: int) -> dict:
         """Gera um resumo financeiro para o mês/ano especificado."""
+        self._garantir_conexao()
         try:
-            # Check cache first
-            cache_key = self._get_cache_key("resumo", ano, mes)
-            cached_result = self._get_cached_data(cache_key)
-            if cached_result:
-                return cached_result
-
-            alugueis_df, transacoes_df = self.buscar_dados_do_mes(ano, mes)
-
-            # Converter colunas numéricas
-            alugueis_df['valor'] = pd.to_numeric(alugueis_df['valor'], errors='coerce').fillna(0)
-            transacoes_df['valor'] = pd.to_numeric(transacoes_df['valor'], errors='coerce').fillna(0)
-
-            # Resumo de alugueis
-            alugueis_pago = alugueis_df[alugueis_df['status'] == 'Pago']['valor'].sum()
-            alugueis_a_pagar = alugueis_df[alugueis_df['status'] != 'Pago']['valor'].sum()
-            total_alugueis = len(alugueis_df)
-            total_horas = pd.to_numeric(alugueis_df['horas_alugadas'], errors='coerce').fillna(0).sum()
-
-            # Resumo de transações
-            transacoes_entradas = transacoes_df[transacoes_df['tipo'] == 'Entrada']['valor'].sum()
-            transacoes_saidas = transacoes_df[transacoes_df['tipo'] == 'Saída']['valor'].sum()
-            total_transacoes = len(transacoes_df)
-
-            result = {
-                'alugueis': {
-                    'total_pago': alugueis_pago,
-                    'total_a_pagar': alugueis_a_pagar,
-                    'total_alugueis': total_alugueis,
-                    'total_horas': total_horas
-                },
-                'transacoes': {
-                    'total_entradas': transacoes_entradas,
-                    'total_saidas': transacoes_saidas,
-                    'total_transacoes': total_transacoes
-                }
-            }
+            def carregar():
+                # Totais mantidos por deltas na réplica: consulta por chave, sem varrer os dados
+                if not self.offline_mode:
+                    self._sincronizar_replica(mes=f"{ano}-{mes:02d}")
+                return self.replica.resumo_mes(ano, mes)
 
-            # Cache the result
-            self._cache_data(cache_key, result)
+            cache_key = self._get_cache_key("resumo", ano, mes)
+            result = self._get_or_load(cache_key, self._deps_mes(ano, mes), carregar)
 
             # Also cache for sidebar (using same data)
             sidebar_cache_key = self._get_cache_key("sidebar_resumo", ano, mes)
-            self._cache_data(sidebar_cache_key, result)
+            self._cache_data(sidebar_cache_key, result, self._deps_mes(ano, mes))
 
             return result
         except Exception as e:
@@ -639,114 +1118,263 @@ class GoogleSheetsDatabase:
                 raise Exception(f"Limite da API atingido. Tente novamente em alguns instantes. Erro: {str(e)}")
             raise Exception(f"Erro ao gerar resumo financeiro: {str(e)}")
 
+    def migrar_para_particoes(self) -> Dict[str, int]:
+        """Divide as worksheets únicas em uma worksheet por ano e tabela ('alugueis_2025', ...).
+
+        As worksheets originais são mantidas como backup, renomeadas para '<tabela>_original'
+        só depois que as partições das duas tabelas foram criadas; se alguma criação falhar,
+        as partições já criadas são removidas e a planilha fica como estava. Outras instâncias da aplicação continuam gravando nas worksheets antigas até serem
+        reiniciadas, então devem estar paradas durante a migração.
+
+        Returns:
+            Dict com o número de linhas gravadas em cada worksheet criada
+        """
+        self._garantir_conexao()
+        try:
+            if self.offline_mode:
+                raise Exception("Migração indisponível em modo offline.")
+            if self.particionado:
+                raise Exception("A planilha já está particionada por ano.")
+
+            # Flush worker and row updates held off until the rows are in the yearly worksheets
+            with self._linhas_lock, self._flush_lock:
+                # Enviar o que ainda está na fila antes de ler as worksheets
+                self._enviar_fila()
+
+                originais = {}
+                linhas_por_ano = {}
+                for tabela in ('alugueis', 'transacoes'):
+                    worksheet = self._worksheet_do_mes(tabela, None)
+                    originais[tabela] = worksheet
+                    # Valores sem formatação, para os números serem copiados como números
+                    dados = self._retry_with_backoff(worksheet.get_all_values,
+                                                     value_render_option=ValueRenderOption.unformatted)
+                    cabecalho = dados[0] if dados else COLUNAS[tabela]
+
+                    por_ano = {}
+                    for row in dados[1:]:
+                        registro = dict(zip(cabecalho, row))
+                        linha = [registro.get(coluna, '') for coluna in COLUNAS[tabela]]
+                        if not any(linha) or str(registro.get(COLUNA_EXCLUSAO) or '').strip():
+                            continue
+                        mes = self._chave_mes_linha(tabela, linha)
+                        ano = int(mes[:4]) if mes else datetime.now().year
+                        if mes is None:
+                            print(f"AVISO: Registro {linha[0]} de {tabela} sem mês válido, movido para {ano}")
+                        por_ano.setdefault(ano, []).append(linha)
+                    # Toda tabela fica com ao menos uma partição, senão a planilha pareceria migrada pela metade
+                    linhas_por_ano[tabela] = por_ano or {datetime.now().year: []}
+
+                criadas = {}
+                novas = []
+                try:
+                    for tabela, por_ano in linhas_por_ano.items():
+                        for ano, linhas in sorted(por_ano.items()):
+                            titulo = f"{tabela}_{ano}"
+                            particao = self.spreadsheet.add_worksheet(titulo, len(linhas) + 1,
+                                                                      len(COLUNAS_PLANILHA[tabela]))
+                            novas.append(particao)
+                            self._retry_with_backoff(particao.update, range_name='A1',
+                                                     values=[COLUNAS_PLANILHA[tabela]] + linhas, escrita=True)
+                            criadas[titulo] = len(linhas)
+                            print(f"DEBUG: Worksheet '{titulo}' criada com {len(linhas)} linha(s)")
+                except Exception:
+                    # Desfazer: sem as partições, a planilha continua no layout de worksheet única
+                    for particao in novas:
+                        try:
+                            self._retry_with_backoff(self.spreadsheet.del_worksheet, particao, escrita=True)
+                        except Exception as e:
+                            print(f"AVISO: Não foi possível remover a worksheet '{particao.title}': {e}")
+                    raise
+
+                for tabela, worksheet in originais.items():
+                    self._retry_with_backoff(worksheet.update_title, f"{tabela}_original", escrita=True)
+
+                for particao in novas:
+                    self.particoes[particao.title.rsplit('_', 1)[0]][self._ano_da_particao(particao)] = particao
+                self.particionado = True
+                self.alugueis_worksheet = None
+                self.transacoes_worksheet = None
+
+            # Reconstruir a réplica a partir das partições
+            self._sincronizar_replica(forcar=True)
+            self.cache.clear()
+            return criadas
+        except Exception as e:
+            raise Exception(f"Erro ao migrar para worksheets por ano: {str(e)}")
+
+    def compactar(self) -> Dict[str, int]:
+        """Remove fisicamente das worksheets as linhas marcadas como excluídas.
+
+        Cada worksheet com exclusões é reescrita numa única chamada de update, limpando as
+        linhas que sobram no fim. Deve rodar fora do horário de uso: linhas anexadas por
+        outra instância durante a reescrita seriam perdidas.
+
+        Returns:
+            Dict com o número de linhas removidas de cada worksheet
+        """
+        self._garantir_conexao()
+        try:
+            if self.offline_mode:
+                return {}
+
+            # Enviar o que ainda está na fila antes de ler as worksheets
+            self._flush_fila()
+
+            removidas = {}
+            # Same order as the status updates/deletes, whose row lookup may flush while holding _linhas_lock
+            with self._linhas_lock, self._flush_lock:
+                for tabela in ('alugueis', 'transacoes'):
+                    for worksheet in self._worksheets_da_tabela(tabela):
+                        # Valores sem formatação, para os números serem regravados como números
+                        dados = self._retry_with_backoff(worksheet.get_all_values,
+                                                         value_render_option=ValueRenderOption.unformatted)
+                        if not dados or COLUNA_EXCLUSAO not in dados[0]:
+                            continue
+
+                        cabecalho = dados[0]
+                        coluna = cabecalho.index(COLUNA_EXCLUSAO)
+                        # Linhas completadas até a largura do cabeçalho, para sobrescrever todas as células
+                        linhas = [list(row) + [''] * (len(cabecalho) - len(row)) for row in dados[1:]]
+                        mantidas = [row for row in linhas if not str(row[coluna]).strip()]
+                        excluidas = len(dados) - 1 - len(mantidas)
+                        if not excluidas:
+                            continue
+
+                        valores = [cabecalho] + mantidas + [[''] * len(cabecalho) for _ in range(excluidas)]
+                        self._retry_with_backoff(worksheet.update, range_name='A1', values=valores, escrita=True)
+                        self._substituir_replica(tabela, worksheet, [cabecalho] + mantidas)
+                        removidas[worksheet.title] = excluidas
+
+            return removidas
+        except Exception as e:
+            raise Exception(f"Erro ao compactar worksheets: {str(e)}")
+
     def obter_dias_semana(self) -> list:
         """Retorna a lista de dias da semana para formulários."""
         return ['Segunda-feira', 'Terça-feira', 'Quarta-feira', 'Quinta-feira', 'Sexta-feira', 'Sábado', 'Domingo']
 
     def buscar_todos_os_dados(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """Busca todos os dados de uma só vez para evitar múltiplas chamadas API."""
+        self._garantir_conexao()
         try:
             if self.offline_mode:
-                # Modo offline - usar dados locais
-                alugueis_df = pd.DataFrame(self.local_data['alugueis'])
-                transacoes_df = pd.DataFrame(self.local_data['transacoes'])
-
-                if alugueis_df.empty:
-                    alugueis_df = pd.DataFrame(columns=[
-                        'id', 'dia_semana', 'mes_referencia', 'horario_inicio',
-                        'horas_alugadas', 'cliente_time', 'valor', 'status', 'data_criacao'
-                    ])
-
-                if transacoes_df.empty:
-                    transacoes_df = pd.DataFrame(columns=[
-                        'id', 'data_transacao', 'tipo', 'descricao', 'valor', 'observacao', 'data_criacao'
-                    ])
-
-                return alugueis_df, transacoes_df
+                # Modo offline - ler da réplica local, com as linhas ainda na fila
+                return self.replica.consultar_todos()
             else:
-                # Check cache first
+                # Modo online - Google Sheets com uma única chamada
+                if not self._worksheets_disponiveis():
+                    raise Exception("Worksheets não disponíveis. Verifique a conexão com Google Sheets.")
+
+                def carregar():
+                    # Sincronizar só as linhas novas e ler tudo da réplica local
+                    self._sincronizar_replica()
+                    # Colunas já tipadas pela réplica (decodificar)
+                    return self.replica.consultar_todos()
+
                 cache_key = self._get_cache_key("todos_dados")
-                cached_result = self._get_cached_data(cache_key)
-                if cached_result:
-                    return cached_result
+                deps = [('alugueis', TODOS_OS_MESES), ('transacoes', TODOS_OS_MESES)]
+                return self._get_or_load(cache_key, deps, carregar)
 
-                # Modo online - Google Sheets com uma única chamada
-                if self.alugueis_worksheet is None or self.transacoes_worksheet is None:
+        except Exception as e:
+            # Check for quota/429 errors and provide better error message
+            if "429" in str(e) or "quota" in str(e).lower():
+                raise Exception(f"Limite da API atingido. Tente novamente em alguns instantes. Erro: {str(e)}")
+            raise Exception(f"Erro ao buscar todos os dados: {str(e)}")
+
+    def _particionar_ano(self, ano: int) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[int, slice], Dict[int, slice]]:
+        """Separa o ano em uma passada por tabela: as linhas do ano ordenadas por mês e a faixa de cada mês."""
+        self._garantir_conexao()
+        def carregar():
+            if not self.offline_mode:
+                if not self._worksheets_disponiveis():
                     raise Exception("Worksheets não disponíveis. Verifique a conexão com Google Sheets.")
+                # Reler só as faixas de linhas dos meses do ano (e as partições daquele ano)
+                self._sincronizar_replica(mes=f"{ano}-01", ate=f"{ano}-12")
+            # Só as linhas do ano, pela chave de mês / data na réplica (colunas já tipadas)
+            dados = self.replica.consultar_intervalo(date(ano, 1, 1), date(ano, 12, 31))
+            alugueis_df, transacoes_df = dados['alugueis'], dados['transacoes']
+
+            # Chave de mês calculada uma vez (mes_referencia é MM/YYYY)
+            referencia = alugueis_df['mes_referencia'].astype(str)
+            alugueis_ano, faixas_alugueis = _agrupar_por_mes(
+                alugueis_df, referencia.str[3:] == str(ano), pd.to_numeric(referencia.str[:2], errors='coerce')
+            )
+            datas = transacoes_df['data_transacao']
+            transacoes_ano, faixas_transacoes = _agrupar_por_mes(
+                transacoes_df, datas.dt.year == ano, datas.dt.month
+            )
+            return alugueis_ano, transacoes_ano, faixas_alugueis, faixas_transacoes
+
+        if self.offline_mode:
+            return carregar()
+
+        cache_key = self._get_cache_key("dados_ano", ano)
+        deps = [dep for mes in range(1, 13) for dep in self._deps_mes(ano, mes)]
+        return self._get_or_load(cache_key, deps, carregar)
+
+    def buscar_ano(self, ano: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Busca alugueis e transações de um ano inteiro, ordenados por mês (e por id dentro do mês)."""
+        try:
+            alugueis_ano, transacoes_ano, _, _ = self._particionar_ano(ano)
+            return alugueis_ano, transacoes_ano
+        except Exception as e:
+            raise Exception(f"Erro ao buscar dados do ano: {str(e)}")
 
-                # Buscar todos os dados de uma vez
-                alugueis_data = self._retry_with_backoff(self.alugueis_worksheet.get_all_values)
-                transacoes_data = self._retry_with_backoff(self.transacoes_worksheet.get_all_values)
+    def buscar_intervalo(self, inicio: date, fim: date,
+                         tabelas: Tuple[str, ...] = ('alugueis', 'transacoes')) -> Dict[str, pd.DataFrame]:
+        """Busca os registros entre duas datas (inclusive), lendo da planilha só as linhas do intervalo.
 
-                # Converter para DataFrame
-                if len(alugueis_data) > 1:
-                    alugueis_df = pd.DataFrame(alugueis_data[1:], columns=alugueis_data[0])
+        Alugueis entram pelo mês de referência (todos os meses que o intervalo toca);
+        transações, pela data.
 
-                    # Converter colunas numéricas para tipos corretos
-                    alugueis_df['valor'] = pd.to_numeric(alugueis_df['valor'], errors='coerce').fillna(0)
-                    alugueis_df['horas_alugadas'] = pd.to_numeric(alugueis_df['horas_alugadas'], errors='coerce').fillna(0)
-                    alugueis_df['id'] = pd.to_numeric(alugueis_df['id'], errors='coerce').fillna(0).astype(int)
-                else:
-                    alugueis_df = pd.DataFrame(columns=[
-                        'id', 'dia_semana', 'mes_referencia', 'horario_inicio',
-                        'horas_alugadas', 'cliente_time', 'valor', 'status', 'data_criacao'
-                    ])
-
-                if len(transacoes_data) > 1:
-                    transacoes_df = pd.DataFrame(transacoes_data[1:], columns=transacoes_data[0])
-
-                    # Converter colunas de data e numéricas para tipos corretos
-                    transacoes_df['data_transacao'] = pd.to_datetime(transacoes_df['data_transacao'], errors='coerce')
-                    transacoes_df['valor'] = pd.to_numeric(transacoes_df['valor'], errors='coerce').fillna(0)
-                    transacoes_df['id'] = pd.to_numeric(transacoes_df['id'], errors='coerce').fillna(0).astype(int)
-                else:
-                    transacoes_df = pd.DataFrame(columns=[
-                        'id', 'data_transacao', 'tipo', 'descricao', 'valor', 'observacao', 'data_criacao'
-                    ])
+        Returns:
+            Dict {tabela: DataFrame} com as tabelas pedidas
+        """
+        self._garantir_conexao()
+        try:
+            if fim < inicio:
+                raise ValueError("A data final é anterior à inicial")
+            tabelas = tuple(tabela for tabela in ('alugueis', 'transacoes') if tabela in tabelas)
+            mes_inicial, mes_final = f"{inicio:%Y-%m}", f"{fim:%Y-%m}"
+
+            if self.offline_mode:
+                # Modo offline - ler da réplica local, com as linhas ainda na fila
+                return self.replica.consultar_intervalo(inicio, fim, tabelas)
+            else:
+                if not self._worksheets_disponiveis():
+                    raise Exception("Worksheets não disponíveis. Verifique a conexão com Google Sheets.")
 
-                # Cache the result
-                result = (alugueis_df, transacoes_df)
-                self._cache_data(cache_key, result)
+                def carregar():
+                    # Reler só as faixas de linhas dos meses do intervalo e filtrar na réplica local
+                    self._sincronizar_replica(mes=mes_inicial, ate=mes_final, tabelas=tabelas)
+                    return self.replica.consultar_intervalo(inicio, fim, tabelas)
 
-                return result
+                cache_key = self._get_cache_key("intervalo", inicio, fim, *tabelas)
+                deps = [
+                    (tabela, str(mes)) for mes in pd.period_range(mes_inicial, mes_final, freq='M')
+                    for tabela in tabelas
+                ]
+                return self._get_or_load(cache_key, deps, carregar)
 
         except Exception as e:
             # Check for quota/429 errors and provide better error message
             if "429" in str(e) or "quota" in str(e).lower():
                 raise Exception(f"Limite da API atingido. Tente novamente em alguns instantes. Erro: {str(e)}")
-            raise Exception(f"Erro ao buscar todos os dados: {str(e)}")
+            raise Exception(f"Erro ao buscar dados do intervalo: {str(e)}")
 
     def buscar_dados_do_ano(self, ano: int) -> Dict[int, Tuple[pd.DataFrame, pd.DataFrame]]:
-        """Busca todos os dados de um ano inteiro com uma única chamada API."""
+        """Busca todos os dados de um ano inteiro com uma única chamada API, separados por mês."""
         try:
-            # Buscar todos os dados de uma vez
-            alugueis_df, transacoes_df = self.buscar_todos_os_dados()
-
-            # Converter colunas de data
-            if not transacoes_df.empty:
-                transacoes_df['data_transacao'] = pd.to_datetime(transacoes_df['data_transacao'], errors='coerce')
-
-            # Dicionário para armazenar dados de cada mês
-            dados_ano = {}
-
-            for mes in range(1, 13):
-                # Filtrar alugueis por mês
-                mes_ano_str = f"{mes:02d}/{ano}"
-                alugueis_mes = alugueis_df[alugueis_df['mes_referencia'] == mes_ano_str].copy()
-
-                # Filtrar transações por mês
-                if not transacoes_df.empty:
-                    mask = (transacoes_df['data_transacao'].dt.year == ano) & \
-                           (transacoes_df['data_transacao'].dt.month == mes)
-                    transacoes_mes = transacoes_df[mask].copy()
-                else:
-                    transacoes_mes = pd.DataFrame(columns=[
-                        'id', 'data_transacao', 'tipo', 'descricao', 'valor', 'observacao', 'data_criacao'
-                    ])
-
-                dados_ano[mes] = (alugueis_mes, transacoes_mes)
-
-            return dados_ano
+            alugueis_ano, transacoes_ano, faixas_alugueis, faixas_transacoes = self._particionar_ano(ano)
+
+            # Fatias contíguas das linhas do ano, sem copiar os dados
+            vazio = slice(0, 0)
+            return {
+                mes: (alugueis_ano.iloc[faixas_alugueis.get(mes, vazio)],
+                      transacoes_ano.iloc[faixas_transacoes.get(mes, vazio)])
+                for mes in range(1, 13)
+            }
 
         except Exception as e:
             raise Exception(f"Erro ao buscar dados do ano: {str(e)}")
@@ -759,8 +1387,13 @@ class GoogleSheetsDatabase:
         """Retorna a lista de tipos de transação."""
         return ['Entrada', 'Saída']
 
+@st.cache_resource
+def get_database() -> GoogleSheetsDatabase:
+    """Retorna a camada de dados compartilhada por todas as sessões do Streamlit."""
+    return GoogleSheetsDatabase()
+
 # Instância global do banco de dados
-db = GoogleSheetsDatabase()
+db = get_database()
 
 # Funções de compatibilidade com a interface antiga
 def inicializar_banco():
@@ -784,6 +1417,10 @@ def atualizar_status_aluguel(id_aluguel: int, novo_status: str) -> bool:
     """Função de compatibilidade para atualizar status."""
     return db.atualizar_status_aluguel(id_aluguel, novo_status)
 
+def atualizar_status_em_lote(ids: List[int], novo_status: str) -> int:
+    """Função de compatibilidade para atualizar o status de vários aluguéis."""
+    return db.atualizar_status_em_lote(ids, novo_status)
+
 def deletar_registro(tabela: str, id_registro: int) -> bool:
     """Função de compatibilidade para deletar registro."""
     return db.deletar_registro(tabela, id_registro)
@@ -812,6 +1449,25 @@ def buscar_dados_do_ano(ano: int) -> Dict[int, Tuple[pd.DataFrame, pd.DataFrame]
     """Função de compatibilidade para buscar dados do ano."""
     return db.buscar_dados_do_ano(ano)
 
+def buscar_ano(ano: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Busca alugueis e transações de um ano inteiro, sem separar por mês."""
+    return db.buscar_ano(ano)
+
+def buscar_intervalo(inicio: date, fim: date,
+                     tabelas: Tuple[str, ...] = ('alugueis', 'transacoes')) -> Dict[str, pd.DataFrame]:
+    """Função de compatibilidade para buscar os registros entre duas datas."""
+    return db.buscar_intervalo(inicio, fim, tabelas)
+
+def obter_metricas_cache() -> dict:
+    """Retorna os contadores do cache de dados (hits, misses, evictions) para monitoramento."""
+    metricas = db.cache.metricas()
+    metricas['coalesced'] = db._single_flight.coalesced
+    return metricas
+
+def obter_metricas_rate_limit() -> dict:
+    """Retorna o nível dos token buckets de leitura e escrita da Sheets API."""
+    return {tipo: bucket.nivel() for tipo, bucket in db.rate_limiter.items()}
+
 def obter_meses_referencia() -> list:
     """Retorna lista de meses de referência no formato MM/YYYY, ordenados do mais recente para o mais antigo."""
     from datetime import datetime, timedelta
@@ -847,6 +1503,10 @@ def formatar_mes_ano(mes: int, ano: str) -> str:
 
     return f"{mes:02d}/{ano}"
 
+def formatar_moeda(centavos: int, casas: int = 2) -> str:
+    """Formata um valor em centavos como R$ para exibição."""
+    return f"R$ {centavos / 100:,.{casas}f}"
+
 def obter_anos_disponiveis() -> list:
     """Retorna lista de anos disponíveis (atual -2 até atual +2)."""
     from datetime import datetime
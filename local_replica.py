@@ -0,0 +1,845 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Tuple, Optional, List, Dict, Any, Set
+
+import pandas as pd
+
+from database import criar_tabelas, limites_do_mes
+
+REPLICA_FILE = 'replica_sheets.db'
+# Versão do formato da réplica (PRAGMA user_version); réplicas mais antigas são ressincronizadas
+# 2: valores em centavos inteiros
+# 3: chave_mes NULL fora dos formatos MM/YYYY e YYYY-MM
+VERSAO_REPLICA = 3
+
+# Ordem das colunas nas worksheets (igual à ordem das tabelas em database.py)
+COLUNAS = {
+    'alugueis': [
+        'id', 'dia_semana', 'mes_referencia', 'horario_inicio',
+        'horas_alugadas', 'cliente_time', 'valor', 'status', 'data_criacao'
+    ],
+    'transacoes': [
+        'id', 'data_transacao', 'tipo', 'descricao', 'valor', 'observacao', 'data_criacao'
+    ]
+}
+
+# Coluna extra das worksheets: registros excluídos recebem a data da exclusão e são ignorados
+# nas leituras até a compactação removê-los fisicamente
+COLUNA_EXCLUSAO = 'excluido_em'
+COLUNAS_PLANILHA = {tabela: colunas + [COLUNA_EXCLUSAO] for tabela, colunas in COLUNAS.items()}
+
+COLUNAS_NUMERICAS = {'horas_alugadas'}
+# Valores em dinheiro: reais na planilha, centavos inteiros (int64) na réplica e nos DataFrames
+COLUNAS_MONETARIAS = {'valor'}
+# Colunas de texto com poucos valores distintos, mantidas como category nos DataFrames
+COLUNAS_CATEGORICAS = {'dia_semana', 'cliente_time', 'status', 'tipo'}
+
+RESUMO_ALUGUEIS = ['total_pago', 'total_a_pagar', 'total_alugueis', 'total_horas']
+RESUMO_TRANSACOES = ['total_entradas', 'total_saidas', 'total_transacoes']
+RESUMO_MONETARIOS = {'total_pago', 'total_a_pagar', 'total_entradas', 'total_saidas'}
+
+
+def _to_float(valor: Any) -> float:
+    """Converte um valor da planilha para float, usando 0 quando inválido."""
+    try:
+        return float(str(valor).strip())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def para_centavos(valor: Any) -> int:
+    """Converte um valor em reais (número ou texto da planilha) em centavos inteiros, usando 0 quando inválido."""
+    try:
+        return int((Decimal(str(valor).strip()) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    except (TypeError, ValueError, InvalidOperation):
+        return 0
+
+
+def para_reais(centavos: int) -> float:
+    """Converte centavos inteiros em reais, para gravar na planilha ou exibir."""
+    return centavos / 100
+
+
+def chave_mes_aluguel(mes_referencia: str) -> Optional[str]:
+    """Converte o mes_referencia de um aluguel (MM/YYYY ou YYYY-MM) na chave de mês YYYY-MM.
+
+    Mesma regra da coluna gerada chave_mes (database.CHAVE_MES_SQL).
+    """
+    if len(mes_referencia) != 7:
+        return None
+    if mes_referencia[2] == '/':
+        return f"{mes_referencia[3:]}-{mes_referencia[:2]}"
+    if mes_referencia[4] == '-':
+        return mes_referencia
+    return None
+
+
+def chave_mes_transacao(data_transacao: str) -> Optional[str]:
+    """Extrai a chave de mês YYYY-MM de uma data de transação normalizada."""
+    if len(data_transacao) < 7 or data_transacao[4] != '-':
+        return None
+    return data_transacao[:7]
+
+
+def decodificar(tabela: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Converte, uma única vez, as colunas de um DataFrame da tabela para os tipos do schema.
+
+    ids viram int32, valores int64 (centavos), horas float64, textos repetidos (status,
+    tipo, dia da semana, cliente) category e data_transacao datetime64. Colunas ausentes
+    são criadas.
+    """
+    df = df.reindex(columns=COLUNAS[tabela], fill_value='')
+    for coluna in COLUNAS[tabela]:
+        if coluna == 'id':
+            df[coluna] = pd.to_numeric(df[coluna], errors='coerce').fillna(0).astype('int32')
+        elif coluna in COLUNAS_MONETARIAS:
+            df[coluna] = pd.to_numeric(df[coluna], errors='coerce').fillna(0).round().astype('int64')
+        elif coluna in COLUNAS_NUMERICAS:
+            df[coluna] = pd.to_numeric(df[coluna], errors='coerce').fillna(0).astype('float64')
+        elif coluna in COLUNAS_CATEGORICAS:
+            df[coluna] = df[coluna].astype('category')
+        elif coluna == 'data_transacao':
+            df[coluna] = pd.to_datetime(df[coluna], errors='coerce')
+    return df
+
+
+def _normalizar_data(valor: Any) -> str:
+    """Normaliza datas da planilha para o formato YYYY-MM-DD."""
+    texto = str(valor).strip()
+    try:
+        return datetime.strptime(texto[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        data = pd.to_datetime(texto, errors='coerce')
+        return texto if pd.isna(data) else data.strftime('%Y-%m-%d')
+
+
+class LocalReplica:
+    """Réplica SQLite local das worksheets, sincronizada incrementalmente com o Google Sheets.
+
+    As tabelas usam o mesmo schema de database.py. A tabela sync_estado guarda, por
+    worksheet, quantas linhas de dados já foram copiadas e quando ocorreram a última
+    sincronização incremental e a última completa. A tabela fila_escrita é a fila
+    write-behind: linhas já gravadas na réplica que ainda não foram enviadas à planilha.
+    A tabela id_marca guarda, por tabela, o maior id já reservado (high-water mark).
+    A tabela resumo_mensal mantém os totais de cada mês (chave YYYY-MM), atualizados por
+    deltas a cada escrita. A tabela linhas_planilha indexa em que linha de cada worksheet
+    está cada registro e de qual mês ele é, para que um mês possa ser relido buscando só
+    as faixas de linhas dele. Valores em dinheiro ficam em centavos inteiros.
+    """
+
+    def __init__(self, db_file: str = REPLICA_FILE):
+        self.db_file = db_file
+        self._inicializar()
+
+    def _inicializar(self):
+        """Cria as tabelas da réplica se não existirem."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            tabelas_existentes = {nome for (nome,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )}
+
+            versao = conn.execute('PRAGMA user_version').fetchone()[0]
+            if versao < VERSAO_REPLICA and 'sync_estado' in tabelas_existentes:
+                # Réplica em formato anterior: descartar os dados copiados e sincronizar tudo de novo
+                # (a fila de escrita e as marcas de id são mantidas). As tabelas de dados são recriadas,
+                # para a coluna gerada chave_mes seguir a regra atual
+                for tabela in ('alugueis', 'transacoes'):
+                    conn.execute(f'DROP TABLE IF EXISTS {tabela}')
+                for tabela in ('linhas_planilha', 'sync_estado'):
+                    if tabela in tabelas_existentes:
+                        conn.execute(f'DELETE FROM {tabela}')
+                conn.execute('DROP TABLE IF EXISTS resumo_mensal')
+                tabelas_existentes.discard('resumo_mensal')
+
+            criar_tabelas(conn)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sync_estado (
+                    aba TEXT PRIMARY KEY,
+                    linhas INTEGER NOT NULL DEFAULT 0,
+                    ultima_sync REAL NOT NULL DEFAULT 0,
+                    ultima_sync_completa REAL NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS fila_escrita (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tabela TEXT NOT NULL,
+                    valores TEXT NOT NULL,
+                    criado_em REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS id_marca (
+                    tabela TEXT PRIMARY KEY,
+                    maior_id INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS resumo_mensal (
+                    mes TEXT PRIMARY KEY,
+                    total_pago INTEGER NOT NULL DEFAULT 0,
+                    total_a_pagar INTEGER NOT NULL DEFAULT 0,
+                    total_alugueis INTEGER NOT NULL DEFAULT 0,
+                    total_horas REAL NOT NULL DEFAULT 0,
+                    total_entradas INTEGER NOT NULL DEFAULT 0,
+                    total_saidas INTEGER NOT NULL DEFAULT 0,
+                    total_transacoes INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            # Sem chave primária em (aba, linha): é só um índice, reconstruído na sincronização completa
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS linhas_planilha (
+                    aba TEXT NOT NULL,
+                    linha INTEGER NOT NULL,
+                    id INTEGER NOT NULL,
+                    mes TEXT
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_linhas_planilha_linha ON linhas_planilha (aba, linha)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_linhas_planilha_mes ON linhas_planilha (aba, mes, linha)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_linhas_planilha_id ON linhas_planilha (aba, id)')
+            if 'resumo_mensal' not in tabelas_existentes:
+                self._recalcular_resumo(conn)
+            if 'linhas_planilha' not in tabelas_existentes:
+                # Réplica anterior ao índice de linhas: a próxima sincronização precisa ser completa
+                conn.execute('UPDATE sync_estado SET ultima_sync_completa = 0')
+            conn.execute(f'PRAGMA user_version = {VERSAO_REPLICA}')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _converter_linha(self, tabela: str, cabecalho: List[str], valores: List[Any]) -> Optional[tuple]:
+        """Converte uma linha da planilha em tupla na ordem das colunas da tabela.
+
+        Retorna None para linhas sem id válido e para registros marcados como excluídos.
+        """
+        registro = dict(zip(cabecalho, valores))
+        id_registro = str(registro.get('id', '')).strip()
+        if not id_registro.isdigit() or str(registro.get(COLUNA_EXCLUSAO) or '').strip():
+            return None
+
+        linha = []
+        for coluna in COLUNAS[tabela]:
+            valor = registro.get(coluna, '')
+            if coluna == 'id':
+                valor = int(id_registro)
+            elif coluna in COLUNAS_MONETARIAS:
+                valor = para_centavos(valor)
+            elif coluna in COLUNAS_NUMERICAS:
+                valor = _to_float(valor)
+            elif coluna == 'data_transacao':
+                valor = _normalizar_data(valor)
+            else:
+                valor = '' if valor is None else str(valor)
+            linha.append(valor)
+        return tuple(linha)
+
+    def _gravar_linhas(self, conn: sqlite3.Connection, tabela: str, linhas: List[tuple]):
+        """Insere ou substitui linhas, ignorando as que violam as restrições do schema."""
+        colunas = COLUNAS[tabela]
+        sql = f'''
+            INSERT OR REPLACE INTO {tabela} ({', '.join(colunas)})
+            VALUES ({', '.join('?' for _ in colunas)})
+        '''
+        try:
+            conn.executemany(sql, linhas)
+        except sqlite3.IntegrityError:
+            for linha in linhas:
+                try:
+                    conn.execute(sql, linha)
+                except sqlite3.IntegrityError as e:
+                    print(f"AVISO: Linha ignorada na réplica de {tabela} (id {linha[0]}): {e}")
+
+    def _buscar_linha(self, conn: sqlite3.Connection, tabela: str, id_registro: int) -> Optional[tuple]:
+        """Busca um registro da réplica pelo id."""
+        colunas = ', '.join(COLUNAS[tabela])
+        return conn.execute(f'SELECT {colunas} FROM {tabela} WHERE id = ?', (id_registro,)).fetchone()
+
+    def _chave_mes(self, tabela: str, linha: tuple) -> Optional[str]:
+        """Retorna a chave de mês YYYY-MM de um registro da tabela."""
+        registro = dict(zip(COLUNAS[tabela], linha))
+        if tabela == 'alugueis':
+            return chave_mes_aluguel(registro['mes_referencia'])
+        return chave_mes_transacao(registro['data_transacao'])
+
+    def _aplicar_delta(self, conn: sqlite3.Connection, tabela: str, linha: tuple, sinal: int):
+        """Soma (sinal=1) ou subtrai (sinal=-1) a contribuição de um registro no resumo do mês."""
+        registro = dict(zip(COLUNAS[tabela], linha))
+        mes = self._chave_mes(tabela, linha)
+        if mes is None:
+            return
+
+        # A coluna valor tem afinidade REAL, então os centavos podem voltar como float
+        centavos = int(registro['valor'])
+        if tabela == 'alugueis':
+            pago = registro['status'] == 'Pago'
+            deltas = {
+                'total_pago': centavos if pago else 0,
+                'total_a_pagar': 0 if pago else centavos,
+                'total_alugueis': 1,
+                'total_horas': registro['horas_alugadas']
+            }
+        else:
+            deltas = {
+                'total_entradas': centavos if registro['tipo'] == 'Entrada' else 0,
+                'total_saidas': centavos if registro['tipo'] == 'Saída' else 0,
+                'total_transacoes': 1
+            }
+
+        conn.execute('INSERT OR IGNORE INTO resumo_mensal (mes) VALUES (?)', (mes,))
+        atribuicoes = ', '.join(f'{campo} = {campo} + ?' for campo in deltas)
+        conn.execute(
+            f'UPDATE resumo_mensal SET {atribuicoes} WHERE mes = ?',
+            [sinal * valor for valor in deltas.values()] + [mes]
+        )
+
+    def _gravar_com_resumo(self, conn: sqlite3.Connection, tabela: str, linhas: List[tuple]) -> Set[str]:
+        """Insere ou substitui linhas atualizando o resumo mensal pela diferença.
+
+        Returns:
+            Chaves de mês (YYYY-MM) afetadas
+        """
+        meses = set()
+        colunas = COLUNAS[tabela]
+        sql = f'''
+            INSERT OR REPLACE INTO {tabela} ({', '.join(colunas)})
+            VALUES ({', '.join('?' for _ in colunas)})
+        '''
+        for linha in linhas:
+            anterior = self._buscar_linha(conn, tabela, linha[0])
+            try:
+                conn.execute(sql, linha)
+            except sqlite3.IntegrityError as e:
+                print(f"AVISO: Linha ignorada na réplica de {tabela} (id {linha[0]}): {e}")
+                continue
+
+            if anterior is not None:
+                if anterior == linha:
+                    continue
+                self._aplicar_delta(conn, tabela, anterior, -1)
+                meses.add(self._chave_mes(tabela, anterior))
+            self._aplicar_delta(conn, tabela, linha, 1)
+            meses.add(self._chave_mes(tabela, linha))
+
+        meses.discard(None)
+        return meses
+
+    def _recalcular_resumo(self, conn: sqlite3.Connection):
+        """Reconstrói todo o resumo mensal a partir das tabelas da réplica."""
+        conn.execute('DELETE FROM resumo_mensal')
+        conn.execute('''
+            INSERT INTO resumo_mensal (mes, total_pago, total_a_pagar, total_alugueis, total_horas)
+            SELECT
+                chave_mes,
+                SUM(CASE WHEN status = 'Pago' THEN CAST(valor AS INTEGER) ELSE 0 END),
+                SUM(CASE WHEN status != 'Pago' THEN CAST(valor AS INTEGER) ELSE 0 END),
+                COUNT(*),
+                SUM(horas_alugadas)
+            FROM alugueis
+            WHERE chave_mes IS NOT NULL
+            GROUP BY chave_mes
+        ''')
+        conn.execute('''
+            INSERT INTO resumo_mensal (mes, total_entradas, total_saidas, total_transacoes)
+            SELECT
+                substr(data_transacao, 1, 7),
+                SUM(CASE WHEN tipo = 'Entrada' THEN CAST(valor AS INTEGER) ELSE 0 END),
+                SUM(CASE WHEN tipo = 'Saída' THEN CAST(valor AS INTEGER) ELSE 0 END),
+                COUNT(*)
+            FROM transacoes
+            WHERE data_transacao LIKE '____-__%'
+            GROUP BY 1
+            ON CONFLICT(mes) DO UPDATE SET
+                total_entradas = excluded.total_entradas,
+                total_saidas = excluded.total_saidas,
+                total_transacoes = excluded.total_transacoes
+        ''')
+
+    def _reaplicar_pendentes(self, conn: sqlite3.Connection, tabela: str):
+        """Regrava na tabela as linhas da fila que ainda não chegaram à planilha."""
+        pendentes = conn.execute(
+            'SELECT valores FROM fila_escrita WHERE tabela = ? ORDER BY seq', (tabela,)
+        ).fetchall()
+        linhas = [self._converter_linha(tabela, COLUNAS[tabela], json.loads(valores)) for (valores,) in pendentes]
+        self._gravar_linhas(conn, tabela, [linha for linha in linhas if linha])
+
+    def _indexar_linhas(self, conn: sqlite3.Connection, tabela: str, aba: str,
+                        primeira_linha: int, linhas: List[Optional[tuple]]):
+        """Registra a linha da worksheet e o mês de cada registro, a partir de primeira_linha."""
+        conn.executemany(
+            'INSERT INTO linhas_planilha (aba, linha, id, mes) VALUES (?, ?, ?, ?)',
+            [(aba, primeira_linha + i, linha[0], self._chave_mes(tabela, linha))
+             for i, linha in enumerate(linhas) if linha]
+        )
+
+    def _salvar_estado(self, conn: sqlite3.Connection, aba: str, linhas: int, completa: bool):
+        """Atualiza o estado de sincronização de uma worksheet."""
+        agora = time.time()
+        conn.execute('''
+            INSERT INTO sync_estado (aba, linhas, ultima_sync, ultima_sync_completa)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(aba) DO UPDATE SET
+                linhas = excluded.linhas,
+                ultima_sync = excluded.ultima_sync,
+                ultima_sync_completa = CASE WHEN ? THEN excluded.ultima_sync_completa
+                                            ELSE sync_estado.ultima_sync_completa END
+        ''', (aba, linhas, agora, agora if completa else 0, completa))
+
+    def estado(self, aba: str) -> Tuple[int, float, float]:
+        """Retorna (linhas sincronizadas, última sync, última sync completa) de uma worksheet."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            row = conn.execute(
+                'SELECT linhas, ultima_sync, ultima_sync_completa FROM sync_estado WHERE aba = ?', (aba,)
+            ).fetchone()
+            return tuple(row) if row else (0, 0.0, 0.0)
+        finally:
+            conn.close()
+
+    def substituir(self, tabela: str, aba: str, dados: List[List[Any]], ano: Optional[int] = None):
+        """Substitui o conteúdo da tabela pelos dados completos da worksheet (cabeçalho incluso).
+
+        Com ano (worksheet de uma partição anual), só os registros daquele ano são substituídos.
+        """
+        cabecalho = dados[0] if dados else COLUNAS[tabela]
+        linhas = [self._converter_linha(tabela, cabecalho, row) for row in dados[1:]]
+
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            if ano is None:
+                conn.execute(f'DELETE FROM {tabela}')
+            elif tabela == 'alugueis':
+                conn.execute('DELETE FROM alugueis WHERE mes_referencia LIKE ?', (f'__/{ano}',))
+            else:
+                conn.execute('DELETE FROM transacoes WHERE data_transacao LIKE ?', (f'{ano}-%',))
+            conn.execute('DELETE FROM linhas_planilha WHERE aba = ?', (aba,))
+            self._gravar_linhas(conn, tabela, [linha for linha in linhas if linha])
+            self._indexar_linhas(conn, tabela, aba, 2, linhas)
+            self._reaplicar_pendentes(conn, tabela)
+            self._recalcular_resumo(conn)
+            self._salvar_estado(conn, aba, max(len(dados) - 1, 0), completa=True)
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+
+    def anexar(self, tabela: str, aba: str, linhas_anteriores: int, novas: List[List[Any]]) -> Set[str]:
+        """Aplica as linhas adicionadas na worksheet após as linhas já sincronizadas.
+
+        Returns:
+            Chaves de mês (YYYY-MM) cujos dados mudaram na réplica
+        """
+        linhas = [self._converter_linha(tabela, COLUNAS_PLANILHA[tabela], row) for row in novas]
+
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            meses = self._gravar_com_resumo(conn, tabela, [linha for linha in linhas if linha])
+            # Linha 1 é o cabeçalho, então a primeira linha nova é linhas_anteriores + 2
+            conn.execute('DELETE FROM linhas_planilha WHERE aba = ? AND linha >= ?', (aba, linhas_anteriores + 2))
+            self._indexar_linhas(conn, tabela, aba, linhas_anteriores + 2, linhas)
+            self._salvar_estado(conn, aba, linhas_anteriores + len(novas), completa=False)
+            conn.commit()
+            return meses
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+
+    def indexar_enviadas(self, tabela: str, aba: str, primeira_linha: int, valores: List[List[Any]]):
+        """Registra no índice de linhas os registros que o flush anexou à worksheet a partir de primeira_linha.
+
+        As linhas continuam após as sincronizadas (sync_estado não muda); a próxima
+        sincronização incremental as relê e reindexa do mesmo jeito.
+        """
+        linhas = [self._converter_linha(tabela, COLUNAS[tabela], row) for row in valores]
+
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            conn.execute(
+                'DELETE FROM linhas_planilha WHERE aba = ? AND linha BETWEEN ? AND ?',
+                (aba, primeira_linha, primeira_linha + len(valores) - 1)
+            )
+            self._indexar_linhas(conn, tabela, aba, primeira_linha, linhas)
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+
+    def enfileirar(self, tabela: str, valores: List[Any]):
+        """Grava o registro na réplica e na fila de escrita, na mesma transação."""
+        linha = self._converter_linha(tabela, COLUNAS[tabela], valores)
+
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            if linha is not None:
+                self._gravar_com_resumo(conn, tabela, [linha])
+            conn.execute(
+                'INSERT INTO fila_escrita (tabela, valores, criado_em) VALUES (?, ?, ?)',
+                (tabela, json.dumps(valores), time.time())
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+
+    def pendentes(self) -> Dict[str, List[Tuple[int, List[Any]]]]:
+        """Retorna as linhas da fila de escrita agrupadas por tabela, na ordem de inserção."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            rows = conn.execute('SELECT seq, tabela, valores FROM fila_escrita ORDER BY seq').fetchall()
+        finally:
+            conn.close()
+
+        fila = {}
+        for seq, tabela, valores in rows:
+            fila.setdefault(tabela, []).append((seq, json.loads(valores)))
+        return fila
+
+    def renumerar_pendente(self, seq: int, novo_id: int):
+        """Troca o id de uma linha da fila de escrita (id já usado na planilha por outro registro)."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            row = conn.execute('SELECT valores FROM fila_escrita WHERE seq = ?', (seq,)).fetchone()
+            if row is not None:
+                valores = json.loads(row[0])
+                valores[0] = novo_id
+                conn.execute('UPDATE fila_escrita SET valores = ? WHERE seq = ?', (json.dumps(valores), seq))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def total_pendentes(self) -> int:
+        """Retorna quantas linhas aguardam envio à planilha."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            return conn.execute('SELECT COUNT(*) FROM fila_escrita').fetchone()[0]
+        finally:
+            conn.close()
+
+    def confirmar(self, seqs: List[int]):
+        """Remove da fila as linhas já enviadas à planilha."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            conn.executemany('DELETE FROM fila_escrita WHERE seq = ?', [(seq,) for seq in seqs])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def max_id(self, tabela: str) -> int:
+        """Retorna o maior id presente na réplica (incluindo linhas ainda na fila)."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            return conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {tabela}').fetchone()[0]
+        finally:
+            conn.close()
+
+    def elevar_marca_id(self, tabela: str, maior_id: int):
+        """Garante que os próximos blocos de ids comecem acima de maior_id."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            conn.execute(
+                'INSERT INTO id_marca (tabela, maior_id) VALUES (?, ?) '
+                'ON CONFLICT(tabela) DO UPDATE SET maior_id = MAX(maior_id, excluded.maior_id)',
+                (tabela, maior_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def reservar_ids(self, tabela: str, quantidade: int) -> Tuple[int, int]:
+        """Reserva um bloco de ids acima da marca persistida e do maior id da réplica.
+
+        Returns:
+            Tuple (primeiro_id, ultimo_id) do bloco reservado
+        """
+        conn = sqlite3.connect(self.db_file, isolation_level=None)
+
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT maior_id FROM id_marca WHERE tabela = ?', (tabela,)).fetchone()
+            maior_id = max(row[0] if row else 0,
+                           conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {tabela}').fetchone()[0])
+            conn.execute(
+                'INSERT INTO id_marca (tabela, maior_id) VALUES (?, ?) '
+                'ON CONFLICT(tabela) DO UPDATE SET maior_id = excluded.maior_id',
+                (tabela, maior_id + quantidade)
+            )
+            conn.execute('COMMIT')
+            return maior_id + 1, maior_id + quantidade
+        except sqlite3.Error as e:
+            conn.execute('ROLLBACK')
+            raise e
+        finally:
+            conn.close()
+
+    def chave_mes(self, tabela: str, id_registro: int) -> Optional[str]:
+        """Retorna a chave de mês YYYY-MM de um registro da réplica, ou None se não existir."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            linha = self._buscar_linha(conn, tabela, id_registro)
+            return self._chave_mes(tabela, linha) if linha else None
+        finally:
+            conn.close()
+
+    def atualizar_status(self, id_aluguel: int, novo_status: str):
+        """Atualiza o status de um aluguel na réplica."""
+        self.atualizar_status_em_lote([id_aluguel], novo_status)
+
+    def atualizar_status_em_lote(self, ids: List[int], novo_status: str):
+        """Atualiza o status de vários aluguéis na réplica, numa única transação."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            for id_aluguel in ids:
+                anterior = self._buscar_linha(conn, 'alugueis', id_aluguel)
+                if anterior is not None:
+                    conn.execute('UPDATE alugueis SET status = ? WHERE id = ?', (novo_status, id_aluguel))
+                    self._aplicar_delta(conn, 'alugueis', anterior, -1)
+                    self._aplicar_delta(conn, 'alugueis', self._buscar_linha(conn, 'alugueis', id_aluguel), 1)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def marcar_excluido(self, tabela: str, aba: str, id_registro: int):
+        """Remove da réplica um registro marcado como excluído na worksheet.
+
+        A linha continua na worksheet até a compactação, então as demais linhas não mudam
+        de posição; só a entrada do registro sai do índice.
+        """
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            anterior = self._buscar_linha(conn, tabela, id_registro)
+            if anterior is not None:
+                conn.execute(f'DELETE FROM {tabela} WHERE id = ?', (id_registro,))
+                self._aplicar_delta(conn, tabela, anterior, -1)
+            conn.execute('DELETE FROM linhas_planilha WHERE aba = ? AND id = ?', (aba, id_registro))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _descartar_indice(self, conn: sqlite3.Connection, aba: str):
+        """Apaga o índice de linhas de uma worksheet e marca a réplica para sincronização completa."""
+        conn.execute('DELETE FROM linhas_planilha WHERE aba = ?', (aba,))
+        conn.execute('UPDATE sync_estado SET ultima_sync_completa = 0 WHERE aba = ?', (aba,))
+
+    def linhas_dos_registros(self, aba: str, ids: List[int]) -> Dict[int, int]:
+        """Retorna {id: linha da worksheet} dos registros presentes no índice."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            linhas = {}
+            for id_registro in ids:
+                row = conn.execute(
+                    'SELECT linha FROM linhas_planilha WHERE aba = ? AND id = ?', (aba, id_registro)
+                ).fetchone()
+                if row:
+                    linhas[id_registro] = row[0]
+            return linhas
+        finally:
+            conn.close()
+
+    def intervalos_mes(self, aba: str, mes: str, ate: Optional[str] = None) -> List[Tuple[int, int]]:
+        """Retorna as faixas contínuas (linha_inicial, linha_final) da worksheet com registros do mês (ou de mes até ate)."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            # Linhas consecutivas têm a mesma diferença entre número da linha e posição na ordem
+            return conn.execute('''
+                SELECT MIN(linha), MAX(linha) FROM (
+                    SELECT linha, linha - ROW_NUMBER() OVER (ORDER BY linha) AS grupo
+                    FROM linhas_planilha
+                    WHERE aba = ? AND mes BETWEEN ? AND ?
+                )
+                GROUP BY grupo
+                ORDER BY 1
+            ''', (aba, mes, ate or mes)).fetchall()
+        finally:
+            conn.close()
+
+    def atualizar_intervalos(self, tabela: str, aba: str, intervalos: List[Tuple[int, int]],
+                             blocos: List[List[List[Any]]]) -> Optional[Set[str]]:
+        """Aplica as linhas relidas das faixas de um mês, conferindo que o índice ainda confere.
+
+        Se algum id lido não estiver na linha esperada (linhas inseridas ou apagadas
+        diretamente na planilha), nada é gravado, o índice é descartado e retorna None.
+
+        Returns:
+            Chaves de mês (YYYY-MM) cujos dados mudaram, ou None se o índice estiver desatualizado
+        """
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            atualizadas = []
+            for (inicio, fim), bloco in zip(intervalos, blocos):
+                esperados = dict(conn.execute(
+                    'SELECT linha, id FROM linhas_planilha WHERE aba = ? AND linha BETWEEN ? AND ?',
+                    (aba, inicio, fim)
+                ).fetchall())
+                bloco = list(bloco) + [[]] * (fim - inicio + 1 - len(bloco))
+                for numero, row in enumerate(bloco, start=inicio):
+                    linha = self._converter_linha(tabela, COLUNAS_PLANILHA[tabela], row)
+                    if (linha[0] if linha else None) != esperados.get(numero):
+                        self._descartar_indice(conn, aba)
+                        conn.commit()
+                        return None
+                    if linha:
+                        atualizadas.append((numero, linha))
+
+            meses = self._gravar_com_resumo(conn, tabela, [linha for _, linha in atualizadas])
+            conn.executemany(
+                'UPDATE linhas_planilha SET mes = ? WHERE aba = ? AND linha = ?',
+                [(self._chave_mes(tabela, linha), aba, numero) for numero, linha in atualizadas]
+            )
+            conn.commit()
+            return meses
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+
+    def resumo_mes(self, ano: int, mes: int) -> dict:
+        """Retorna os totais pré-calculados do mês no formato de gerar_resumo_financeiro (valores em centavos)."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            row = conn.execute(
+                f"SELECT {', '.join(RESUMO_ALUGUEIS + RESUMO_TRANSACOES)} FROM resumo_mensal WHERE mes = ?",
+                (f"{ano}-{mes:02d}",)
+            ).fetchone()
+        finally:
+            conn.close()
+
+        valores = dict(zip(RESUMO_ALUGUEIS + RESUMO_TRANSACOES, row or [0] * 7))
+        return {
+            'alugueis': {campo: valores[campo] for campo in RESUMO_ALUGUEIS},
+            'transacoes': {campo: valores[campo] for campo in RESUMO_TRANSACOES}
+        }
+
+    def resumos(self) -> List[tuple]:
+        """Retorna todas as linhas do resumo mensal, ordenadas por mês."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            return conn.execute(
+                f"SELECT mes, {', '.join(RESUMO_ALUGUEIS + RESUMO_TRANSACOES)} FROM resumo_mensal ORDER BY mes"
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def consultar_mes(self, ano: int, mes: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Busca alugueis (por mes_referencia MM/YYYY) e transações (por data) de um mês."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            alugueis_df = pd.read_sql_query(
+                'SELECT * FROM alugueis WHERE chave_mes = ? ORDER BY id',
+                conn, params=(f"{ano}-{mes:02d}",)
+            )
+            transacoes_df = pd.read_sql_query(
+                'SELECT * FROM transacoes WHERE data_transacao >= ? AND data_transacao < ? ORDER BY id',
+                conn, params=limites_do_mes(ano, mes)
+            )
+            return decodificar('alugueis', alugueis_df), decodificar('transacoes', transacoes_df)
+        finally:
+            conn.close()
+
+    def consultar_intervalo(self, inicio: date, fim: date,
+                            tabelas: Tuple[str, ...] = ('alugueis', 'transacoes')) -> Dict[str, pd.DataFrame]:
+        """Busca os alugueis dos meses e as transações das datas entre inicio e fim (inclusive), por índice."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            resultado = {}
+            if 'alugueis' in tabelas:
+                alugueis_df = pd.read_sql_query(
+                    'SELECT * FROM alugueis WHERE chave_mes BETWEEN ? AND ? ORDER BY id',
+                    conn, params=(f"{inicio:%Y-%m}", f"{fim:%Y-%m}")
+                )
+                resultado['alugueis'] = decodificar('alugueis', alugueis_df)
+            if 'transacoes' in tabelas:
+                transacoes_df = pd.read_sql_query(
+                    'SELECT * FROM transacoes WHERE data_transacao BETWEEN ? AND ? ORDER BY id',
+                    conn, params=(inicio.isoformat(), fim.isoformat())
+                )
+                resultado['transacoes'] = decodificar('transacoes', transacoes_df)
+            return resultado
+        finally:
+            conn.close()
+
+    def consultar_todos(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Busca todos os alugueis e transações da réplica."""
+        conn = sqlite3.connect(self.db_file)
+
+        try:
+            alugueis_df = pd.read_sql_query('SELECT * FROM alugueis ORDER BY id', conn)
+            transacoes_df = pd.read_sql_query('SELECT * FROM transacoes ORDER BY id', conn)
+            return decodificar('alugueis', alugueis_df), decodificar('transacoes', transacoes_df)
+        finally:
+            conn.close()
+
+
+class IdAllocator:
+    """Distribui ids monotônicos a partir de blocos reservados na réplica.
+
+    Cada inserção consome um id do bloco em memória; a réplica só é consultada ao
+    reservar um novo bloco. Se a sincronização encontrar na planilha um id dentro do
+    bloco atual (escrito por outro processo ou à mão), o bloco é descartado.
+    """
+
+    def __init__(self, replica: LocalReplica, tamanho_bloco: int = 20):
+        self.replica = replica
+        self.tamanho_bloco = tamanho_bloco
+        self._blocos = {}  # tabela -> [próximo id, último id do bloco]
+        self._lock = threading.Lock()
+
+    def tem_bloco(self, tabela: str) -> bool:
+        """Indica se ainda há ids disponíveis no bloco atual da tabela."""
+        bloco = self._blocos.get(tabela)
+        return bloco is not None and bloco[0] <= bloco[1]
+
+    def proximo(self, tabela: str) -> int:
+        """Retorna o próximo id da tabela, reservando um novo bloco se necessário."""
+        with self._lock:
+            if not self.tem_bloco(tabela):
+                self._blocos[tabela] = list(self.replica.reservar_ids(tabela, self.tamanho_bloco))
+
+            bloco = self._blocos[tabela]
+            next_id = bloco[0]
+            bloco[0] += 1
+            return next_id
+
+    def verificar_conflito(self, tabela: str, maior_id_planilha: int) -> bool:
+        """Descarta o bloco atual se a planilha já usa um id que ainda não foi entregue."""
+        with self._lock:
+            bloco = self._blocos.get(tabela)
+            if bloco is not None and maior_id_planilha >= bloco[0]:
+                del self._blocos[tabela]
+                return True
+            return False
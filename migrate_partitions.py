@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+One-shot migration: split the 'alugueis' and 'transacoes' worksheets into one worksheet per year
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from database_sheets import db
+    print("✓ Dependências importadas com sucesso")
+except ImportError as e:
+    print(f"✗ Erro ao importar dependências: {e}")
+    sys.exit(1)
+
+def migrate_partitions():
+    """Split the single worksheets into yearly worksheets"""
+    print("\n=== Migrando para worksheets por ano ===")
+    print("⚠️ Outras instâncias da aplicação devem estar paradas durante a migração")
+
+    try:
+        criadas = db.migrar_para_particoes()
+        for titulo, linhas in criadas.items():
+            print(f"✓ Worksheet '{titulo}' criada com {linhas} linha(s)")
+        print("✓ Worksheets originais mantidas como 'alugueis_original' e 'transacoes_original'")
+        return True
+
+    except Exception as e:
+        print(f"✗ {e}")
+        return False
+
+if __name__ == "__main__":
+    success = migrate_partitions()
+    if success:
+        print("\n✅ Migração concluída!")
+        print("Reinicie as instâncias da aplicação: ao iniciar, elas passam a ler e gravar nas worksheets de cada ano.")
+    else:
+        sys.exit(1)
@@ -0,0 +1,99 @@
+import threading
+import time
+from typing import Any, Dict
+
+# Cota padrão da Sheets API por usuário (a service account conta como um usuário):
+# 60 requisições de leitura e 60 de escrita por minuto
+SHEETS_REQUESTS_POR_MINUTO = 60
+
+
+class TokenBucket:
+    """Token bucket thread-safe: cada chamada consome um token, reabastecido a uma taxa constante.
+
+    Quando não há tokens, acquire() bloqueia até chegar a vez do chamador; as chamadas
+    são atendidas em ordem de chegada, então ninguém falha por excesso de requisições.
+    """
+
+    def __init__(self, capacidade: int = SHEETS_REQUESTS_POR_MINUTO,
+                 por_segundo: float = SHEETS_REQUESTS_POR_MINUTO / 60):
+        self.capacidade = capacidade
+        self.por_segundo = por_segundo
+        self._tokens = float(capacidade)
+        self._ultimo_reabastecimento = time.monotonic()
+        self._cond = threading.Condition()
+        self._proximo_ticket = 0
+        self._ticket_atendido = 0
+        self._abandonados = set()
+        self.esperando = 0
+        self.total_adquiridos = 0
+        self.tempo_total_espera = 0.0
+
+    def _reabastecer(self):
+        """Soma os tokens gerados desde o último reabastecimento, até a capacidade."""
+        agora = time.monotonic()
+        self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo_reabastecimento) * self.por_segundo)
+        self._ultimo_reabastecimento = agora
+
+    def acquire(self, tokens: int = 1) -> float:
+        """Consome tokens, bloqueando em fila até que estejam disponíveis.
+
+        Returns:
+            Segundos que o chamador esperou
+        """
+        inicio = time.monotonic()
+        with self._cond:
+            ticket = self._proximo_ticket
+            self._proximo_ticket += 1
+            self.esperando += 1
+
+            try:
+                while True:
+                    self._reabastecer()
+                    if ticket == self._ticket_atendido and self._tokens >= tokens:
+                        self._tokens -= tokens
+                        break
+
+                    if ticket == self._ticket_atendido:
+                        self._cond.wait((tokens - self._tokens) / self.por_segundo)
+                    else:
+                        self._cond.wait()
+            except BaseException:
+                # Não travar a fila se quem esperava foi interrompido
+                self._abandonados.add(ticket)
+                self._avancar_fila()
+                raise
+            finally:
+                self.esperando -= 1
+
+            self._ticket_atendido += 1
+            self._avancar_fila()
+            self.total_adquiridos += tokens
+            espera = time.monotonic() - inicio
+            self.tempo_total_espera += espera
+            return espera
+
+    def _avancar_fila(self):
+        """Pula tickets abandonados e acorda os próximos da fila."""
+        while self._ticket_atendido in self._abandonados:
+            self._abandonados.discard(self._ticket_atendido)
+            self._ticket_atendido += 1
+        self._cond.notify_all()
+
+    def esvaziar(self):
+        """Zera os tokens disponíveis (usado após um 429, para que todas as threads recuem)."""
+        with self._cond:
+            self._reabastecer()
+            self._tokens = 0.0
+
+    def nivel(self) -> Dict[str, Any]:
+        """Retorna o estado do bucket: tokens disponíveis, ocupação e fila de espera."""
+        with self._cond:
+            self._reabastecer()
+            return {
+                'tokens': round(self._tokens, 2),
+                'capacidade': self.capacidade,
+                'ocupacao': 1 - self._tokens / self.capacidade,
+                'esperando': self.esperando,
+                'total_adquiridos': self.total_adquiridos,
+                'tempo_total_espera': round(self.tempo_total_espera, 3)
+            }
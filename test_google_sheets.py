@@ -117,6 +117,65 @@ def test_worksheet_access(spreadsheet):
         print(f"✗ Erro ao acessar worksheets: {e}")
         return False
 
+def test_change_probe():
+    """Testa se a sonda de alterações evita downloads quando a planilha não mudou"""
+    print("\n=== Testando Sonda de Alterações ===")
+
+    try:
+        from change_probe import LocalChangeProbe
+        from database_sheets import get_database
+
+        db = get_database()
+        db._garantir_conexao()
+        if db.offline_mode:
+            print("✗ Banco em modo offline")
+            return False
+
+        # Sonda local no lugar da do Drive, contando as leituras feitas em cada sincronização
+        # (valores das worksheets ou, sem linhas novas na grade, só os metadados da planilha)
+        sonda_original, intervalo_original = db.change_probe, db.sync_interval
+        ler_faixas, atualizar_grades = db._ler_faixas, db._atualizar_grades
+        leituras = []
+
+        def contar_leituras(faixas):
+            # Sem faixas, _ler_faixas não chama a API
+            if faixas:
+                leituras.append('valores')
+            return ler_faixas(faixas)
+
+        def contar_grades():
+            leituras.append('metadados')
+            return atualizar_grades()
+
+        sonda = LocalChangeProbe()
+        db.change_probe, db.sync_interval = sonda, 0
+        db._ler_faixas, db._atualizar_grades = contar_leituras, contar_grades
+        try:
+            db._sincronizar_replica(forcar=True)
+
+            leituras.clear()
+            db._sincronizar_replica()
+            if leituras:
+                print(f"✗ Planilha sem alterações foi baixada de novo ({len(leituras)} leitura(s))")
+                return False
+            print("✓ Planilha sem alterações não foi baixada de novo")
+
+            sonda.marcar_alteracao()
+            db._sincronizar_replica()
+            if not leituras:
+                print("✗ Alteração na planilha não provocou nova leitura")
+                return False
+            print(f"✓ Alteração na planilha conferida com {len(leituras)} leitura(s): {', '.join(leituras)}")
+            print(f"  - Consultas à sonda: {sonda.consultas}")
+            return True
+        finally:
+            db.change_probe, db.sync_interval = sonda_original, intervalo_original
+            del db._ler_faixas, db._atualizar_grades
+
+    except Exception as e:
+        print(f"✗ Erro ao testar a sonda de alterações: {e}")
+        return False
+
 def main():
     """Função principal de diagnóstico"""
     print("=== Diagnóstico de Conexão Google Sheets ===")
@@ -146,6 +205,11 @@ def main():
         print("\n❌ Problema ao acessar worksheet 'alugueis'")
         return False
 
+    # Testar a sonda de alterações da sincronização
+    if not test_change_probe():
+        print("\n❌ A sonda de alterações não evitou downloads repetidos")
+        return False
+
     print("\n✅ Todos os testes passaram! A conexão com Google Sheets está funcionando.")
     return True
 